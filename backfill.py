@@ -0,0 +1,271 @@
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+
+import requests
+
+import dedup
+import metrics
+import search
+import store
+import urlindex
+from fetcher import Fetcher
+from retryqueue import RetryQueue
+from scrape import extract_links, parse_article, parse_pub_date
+from sites import SITES, get_site
+
+# Backfill crawl of each outlet's paginated archive (sites.py "archive_url").
+#
+# scrape.py only reads the first listing page, so articles that drop off it
+# between runs are missed. backfill.py walks pages 2, 3, ... of every outlet
+# with an archive at the same time, fetching each page's new articles
+# concurrently and storing them page by page, like scrape.run() does. An
+# outlet's walk stops when
+#   - a page links only to articles already in the store (we have caught up),
+#   - every dated link on a page is older than the --since cutoff,
+#   - the archive runs out (a 404 or a page without article links), or
+#   - the crawl budget (--max-pages per outlet, --max-articles per run) is spent.
+# Requests to each host are capped at PER_HOST and archive pages are spaced
+# PAGE_DELAY seconds apart.
+#
+# The frontier (next page and progress of each outlet) is saved to STATE_FILE
+# after every page, so an interrupted or budget-limited run picks up where it
+# stopped. Once an outlet's walk has finished, the next run starts it again
+# from page 2 (after an outage, say); --restart does that for every outlet
+# straight away. Article pages that fail to download go to the retry queue
+# (retryqueue.py), which scrape.py works through on its next runs. Progress is
+# logged to scrape.log.
+#
+#   python backfill.py --since 2025-01-01 --max-pages 40
+
+STATE_FILE = "backfill_state.json"
+FIRST_PAGE = 2
+MAX_PAGES = 50
+MAX_ARTICLES = 1000
+# Politeness: concurrent requests per host, and seconds between archive pages of one outlet
+PER_HOST = 2
+PAGE_DELAY = 1.0
+
+
+def load_state(path=STATE_FILE):
+    if not os.path.exists(path):
+        return {"sites": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state, path=STATE_FILE):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+        f.write("\n")
+    os.replace(path + ".tmp", path)
+
+
+class Backfill:
+    def __init__(self, fetcher, state, since=None, max_pages=MAX_PAGES, max_articles=MAX_ARTICLES,
+                 stop_after_seen=1, store_file=store.STORE_FILE, state_file=STATE_FILE, retry_queue=None):
+        self.fetcher = fetcher
+        self.retry_queue = retry_queue
+        self.state = state
+        self.since = since
+        self.max_pages = max_pages
+        self.articles_left = max_articles
+        self.stop_after_seen = stop_after_seen
+        self.store_file = store_file
+        self.state_file = state_file
+        self.seen = urlindex.load_seen(store_file=store_file)
+        self.duplicates = dedup.DuplicateIndex(store_file=store_file)
+        # Outlets are walked in parallel; storing and the frontier are shared
+        self._lock = threading.Lock()
+
+    def _progress(self, site_name, restart=False):
+        if restart or site_name not in self.state["sites"]:
+            self.state["sites"][site_name] = {
+                "next_page": FIRST_PAGE, "pages": 0, "articles": 0, "seen_streak": 0, "done": False, "reason": None,
+            }
+        return self.state["sites"][site_name]
+
+    def _finish(self, site_name, reason):
+        with self._lock:
+            progress = self._progress(site_name)
+            progress["done"], progress["reason"] = True, reason
+            save_state(self.state, self.state_file)
+        logging.info("[%s] Backfill finished: %s.", site_name, reason)
+
+    def _take_budget(self, wanted):
+        with self._lock:
+            granted = max(0, min(wanted, self.articles_left))
+            self.articles_left -= granted
+            return granted
+
+    def _commit(self, site_name, articles, next_page, seen_only):
+        with self._lock:
+            if articles:
+                for article in articles:
+                    self.duplicates.assign(article)
+                self.duplicates.save()
+                store.upsert(articles, self.store_file)
+                urlindex.add_seen([article["url"] for article in articles])
+                search.add_articles(articles)
+                self.seen.update(article["url"] for article in articles)
+            progress = self._progress(site_name)
+            progress["next_page"] = next_page
+            progress["pages"] += 1
+            progress["articles"] += len(articles)
+            progress["seen_streak"] = progress["seen_streak"] + 1 if seen_only else 0
+            save_state(self.state, self.state_file)
+            if self.retry_queue is not None:
+                self.retry_queue.save()
+            return progress["seen_streak"]
+
+    def crawl_page(self, site, url):
+        """Fetch an archive page and its new articles.
+
+        Returns (links on the page, how many of them were unseen, articles,
+        whether every wanted article was fetched within the budget); links is
+        empty if the page does not exist.
+        """
+        site_name = site["site_name"]
+        response = self.fetcher.get(url)
+        if response.status_code == 404:
+            return [], 0, [], True
+        response.raise_for_status()
+        links = extract_links(site, response.content)
+
+        unseen = [link for link in links if link not in self.seen]
+        to_fetch = []
+        for link in unseen:
+            _, pub_date = parse_pub_date(site, link)
+            if self.since and pub_date and pub_date[:10] < self.since:
+                continue
+            to_fetch.append(link)
+        granted = self._take_budget(len(to_fetch))
+        if granted < len(to_fetch):
+            logging.info("[%s] Article budget left for %d of %d links on %s.", site_name, granted, len(to_fetch), url)
+
+        def on_error(link, error):
+            if self.retry_queue is not None:
+                self.retry_queue.failed(link, site_name, error)
+
+        articles = []
+        for link, article_response in self.fetcher.fetch_all(to_fetch[:granted], on_error):
+            if article_response is not None and article_response.status_code == 200:
+                with metrics.timer("parse_seconds", site=site_name):
+                    articles.append(parse_article(site, link, article_response.content))
+                metrics.inc("articles_backfilled_total", site=site_name)
+            elif article_response is not None:
+                logging.error("[%s] Failed to retrieve article: %s (status code: %s)",
+                              site_name, link, article_response.status_code)
+                if self.retry_queue is not None:
+                    self.retry_queue.failed(link, site_name, f"status code {article_response.status_code}",
+                                            article_response.status_code)
+        return links, len(unseen), articles, granted == len(to_fetch)
+
+    def crawl_site(self, site):
+        site_name = site["site_name"]
+        progress = self._progress(site_name)
+        if progress["done"]:
+            logging.info("[%s] Previous backfill finished (%s); starting again from page %d.",
+                         site_name, progress["reason"], FIRST_PAGE)
+            progress = self._progress(site_name, restart=True)
+        last_page = progress["next_page"] + self.max_pages
+        for page in range(progress["next_page"], last_page):
+            if self.articles_left <= 0:
+                logging.info("[%s] Article budget spent; resume later from page %d.", site_name, page)
+                return
+            url = site["archive_url"].format(page=page)
+            logging.info("[%s] Crawling archive page %d: %s", site_name, page, url)
+            try:
+                links, unseen, articles, complete = self.crawl_page(site, url)
+            except requests.RequestException as e:
+                # The frontier stays on this page for the next run
+                logging.error("[%s] Failed to crawl %s: %s", site_name, url, e)
+                return
+            if not links:
+                self._finish(site_name, f"end of archive at page {page}")
+                return
+
+            # A page cut short by the budget is crawled again on resume; its stored articles are skipped then
+            streak = self._commit(site_name, articles, page + 1 if complete else page, seen_only=not unseen)
+            logging.info("[%s] Page %d: %d links, %d new articles stored.", site_name, page, len(links), len(articles))
+            if not complete:
+                logging.info("[%s] Article budget spent; resume later from page %d.", site_name, page)
+                return
+            if self.stop_after_seen and streak >= self.stop_after_seen:
+                self._finish(site_name, f"only already-seen articles at page {page}")
+                return
+            dated = [parse_pub_date(site, link)[1] for link in links]
+            dated = [pub_date for pub_date in dated if pub_date]
+            if self.since and dated and max(dated)[:10] < self.since:
+                self._finish(site_name, f"reached {self.since} at page {page}")
+                return
+            time.sleep(PAGE_DELAY)
+        logging.info("[%s] Page budget spent; resume later from page %d.", site_name, last_page)
+
+    def run(self, sites):
+        with ThreadPoolExecutor(max_workers=max(len(sites), 1)) as pool:
+            futures = [pool.submit(self.crawl_site, site) for site in sites]
+            for site, future in zip(sites, futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    logging.exception("[%s] Backfill failed: %s", site["site_name"], e)
+
+
+def run(site_names=None, since=None, max_pages=MAX_PAGES, max_articles=MAX_ARTICLES, stop_after_seen=1,
+        restart=False, store_file=store.STORE_FILE, state_file=STATE_FILE):
+    sites = [get_site(name) for name in site_names] if site_names else SITES
+    for site in sites:
+        if not site.get("archive_url"):
+            logging.info("[%s] No paginated archive; skipping.", site["site_name"])
+            print(f"{site['site_name']}: no paginated archive; skipped.")
+    sites = [site for site in sites if site.get("archive_url")]
+    if not sites:
+        return load_state(state_file)
+
+    state = {"sites": {}} if restart else load_state(state_file)
+    state.setdefault("started_at", datetime.now(timezone.utc).isoformat(timespec="seconds"))
+    state["since"] = since
+    retry_queue = RetryQueue()
+    with Fetcher(per_host=PER_HOST, per_host_max=PER_HOST) as fetcher:
+        backfill = Backfill(fetcher, state, since, max_pages, max_articles, stop_after_seen, store_file, state_file,
+                            retry_queue)
+        backfill.run(sites)
+    save_state(state, state_file)
+    retry_queue.save()
+
+    stored = {site["site_name"]: state["sites"].get(site["site_name"], {}).get("articles", 0) for site in sites}
+    for site_name, count in stored.items():
+        progress = state["sites"].get(site_name, {})
+        status = progress.get("reason") or f"resumes at page {progress.get('next_page', FIRST_PAGE)}"
+        print(f"{site_name}: {count} articles backfilled; {status}.")
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill articles from each outlet's paginated archive.")
+    parser.add_argument("--site", action="append", dest="sites", metavar="SITE_NAME",
+                        help="Only backfill this outlet (may be repeated). Defaults to every outlet with an archive.")
+    parser.add_argument("--since", type=date.fromisoformat, metavar="YYYY-MM-DD",
+                        help="Skip articles published before this date and stop at archive pages older than it.")
+    parser.add_argument("--max-pages", type=int, default=MAX_PAGES, help="Archive pages per outlet in this run.")
+    parser.add_argument("--max-articles", type=int, default=MAX_ARTICLES, help="Article pages fetched in this run.")
+    parser.add_argument("--seen-pages", type=int, default=1, metavar="N",
+                        help="Stop an outlet after N consecutive pages of already-seen articles (0: never).")
+    parser.add_argument("--restart", action="store_true",
+                        help=f"Ignore the saved frontier in {STATE_FILE} and start again from page {FIRST_PAGE}.")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"Profile the run with cProfile (written to {metrics.REPORT_DIR}/backfill.prof).")
+    args = parser.parse_args()
+    since = args.since.isoformat() if args.since else None
+    with metrics.run_report("backfill", profile=args.profile):
+        run(args.sites, since, args.max_pages, args.max_articles, args.seen_pages, args.restart)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import statistics
+import tempfile
+from contextlib import ExitStack
+from datetime import datetime, timedelta, timezone
+
+import parsing
+import benchfixtures
+from dashboard_index import ArticleIndex, prepare_articles
+from search import SearchIndex
+from sites import SITES, get_site
+
+# Offline benchmarks of the scrapers, the classifier and the dashboard.
+#
+#   python bench.py                           # every suite, compared with bench_baseline.json
+#   python bench.py --suite parse --suite dashboard --sizes 1000 10000
+#   python bench.py --save-baseline           # make this run the baseline
+#
+# Suites:
+#   scrape     scrape.scrape_sites() against the recorded pages in
+#              benchfixtures.FIXTURES_DIR, each outlet served from its own
+#              local port with a simulated round trip (articles/s)
+#   parse      links from the listings and articles from the article pages
+#              with every installed parser backend (pages/s, MB/s)
+#   classify   classify_articles() on the fixture articles with a tiny,
+#              randomly initialized BART NLI model built locally, scoring the
+#              full content and a TOKEN_BUDGET lead (articles/s)
+#   dashboard  loading, filtering, sorting and searching synthetic corpora of
+#              CORPUS_SIZES articles the way dashboard.py does (seconds, ms)
+#
+# Every run is written to RESULTS_DIR/<timestamp>.json. Results are compared
+# with the baseline file, and a result worse than the baseline by more than
+# THRESHOLD makes the run exit with status 1, unless the difference is a
+# timing under NOISE_FLOOR seconds, which is noise. Timings depend on the machine,
+# so a baseline is only meaningful on the machine that recorded it; the
+# committed bench_baseline.json lists the machine it came from, and is saved
+# again with --save-baseline when a change moves a result on purpose.
+
+RESULTS_DIR = "bench_results"
+BASELINE_FILE = "bench_baseline.json"
+# Fraction by which a result may be worse than the baseline
+THRESHOLD = 0.20
+# Timings that differ from the baseline by less than this many seconds are never regressions
+NOISE_FLOOR = 0.005
+# Seconds per unit of the timed results
+TIME_UNITS = {"s": 1.0, "ms": 0.001}
+SUITES = ["scrape", "parse", "classify", "dashboard"]
+CORPUS_SIZES = [1_000, 10_000, 100_000]
+# Timed runs per measurement; the best (or, for the dashboard's millisecond timings, median) one counts
+REPEAT = 3
+DASHBOARD_REPEAT = 20
+# Minimum length of one timed parse run, in seconds
+PARSE_SECONDS = 0.5
+CLASSIFY_ARTICLES = 48
+STANDIN_MODEL = os.path.join(".cache", "bench", "standin-nli")
+
+
+def _result(results, name, value, unit, better):
+    results[name] = {"value": round(value, 6), "unit": unit, "better": better}
+
+
+def _fixture_pages(fixture):
+    """(listing pages, [(body_extractor, article page)]) of one outlet."""
+    body_extractor = get_site(fixture["site_name"])["body_extractor"]
+    listing_key = benchfixtures.request_key(fixture["scrape_url"])
+    listings, articles = [], []
+    for key, path in fixture["pages"].items():
+        with open(path, "rb") as f:
+            html = f.read()
+        if key == listing_key:
+            listings.append(html)
+        else:
+            articles.append((body_extractor, html))
+    return listings, articles
+
+
+def bench_scrape(fixtures, results, repeat=REPEAT, latency=benchfixtures.LATENCY):
+    import scrape
+    from retryqueue import RetryQueue
+
+    expected = sum(len(fixture["pages"]) - 1 for fixture in fixtures)
+    best = None
+    with ExitStack() as stack:
+        servers = [stack.enter_context(benchfixtures.FixtureServer(fixture, latency)) for fixture in fixtures]
+        sites = [server.site() for server in servers]
+        for _ in range(repeat):
+            # Failures go to a throwaway queue, not the real retry_queue.json
+            with tempfile.TemporaryDirectory() as tmp:
+                retry_queue = RetryQueue(os.path.join(tmp, "retry_queue.json"))
+                start = time.perf_counter()
+                articles = scrape.scrape_sites(sites, set(), use_cache=False, retry_queue=retry_queue)
+                seconds = time.perf_counter() - start
+            if len(articles) != expected:
+                logging.warning("Scraped %d of %d fixture articles.", len(articles), expected)
+            best = seconds if best is None else min(best, seconds)
+    _result(results, "scrape.seconds", best, "s", "lower")
+    _result(results, "scrape.articles_per_second", expected / best, "articles/s", "higher")
+
+
+def bench_parse(fixtures, results, repeat=REPEAT):
+    listings, articles = [], []
+    for fixture in fixtures:
+        site_listings, site_articles = _fixture_pages(fixture)
+        listings += site_listings
+        articles += site_articles
+    pages = len(listings) + len(articles)
+    megabytes = (sum(len(html) for html in listings) + sum(len(html) for _, html in articles)) / 1e6
+    for name in parsing.available_backends():
+        backend = parsing.get_backend(name)
+        best = None
+        for _ in range(repeat):
+            # Whole passes over the pages until PARSE_SECONDS have gone by; one pass is too short to time
+            passes = 0
+            start = time.perf_counter()
+            while passes == 0 or time.perf_counter() - start < PARSE_SECONDS:
+                for html in listings:
+                    parsing.extract_hrefs(html, backend)
+                for body_extractor, html in articles:
+                    parsing.extract_article(html, body_extractor, backend)
+                passes += 1
+            seconds = (time.perf_counter() - start) / passes
+            best = seconds if best is None else min(best, seconds)
+        _result(results, f"parse.{name}.pages_per_second", pages / best, "pages/s", "higher")
+        _result(results, f"parse.{name}.mb_per_second", megabytes / best, "MB/s", "higher")
+
+
+def build_standin_model(path=STANDIN_MODEL):
+    """A tiny BART NLI model with a byte-level tokenizer, so classify runs without a download.
+
+    Its scores are meaningless, but it goes through the same tokenization,
+    batching and forward passes as facebook/bart-large-mnli.
+    """
+    if os.path.exists(os.path.join(path, "config.json")):
+        return path
+    import torch
+    from transformers import BartConfig, BartForSequenceClassification, BartTokenizer
+    from transformers.models.gpt2.tokenization_gpt2 import bytes_to_unicode
+
+    vocab = {"<s>": 0, "<pad>": 1, "</s>": 2, "<unk>": 3}
+    for char in bytes_to_unicode().values():
+        vocab[char] = len(vocab)
+    vocab["<mask>"] = len(vocab)
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "vocab.json"), "w", encoding="utf-8") as f:
+            json.dump(vocab, f)
+        with open(os.path.join(tmp, "merges.txt"), "w", encoding="utf-8") as f:
+            f.write("#version: 0.2\n")
+        tokenizer = BartTokenizer(os.path.join(tmp, "vocab.json"), os.path.join(tmp, "merges.txt"),
+                                  model_max_length=1024)
+    # Fixed seed: the same weights on every machine
+    torch.manual_seed(0)
+    config = BartConfig(
+        vocab_size=len(vocab), d_model=32, encoder_layers=1, decoder_layers=1,
+        encoder_attention_heads=2, decoder_attention_heads=2, encoder_ffn_dim=64, decoder_ffn_dim=64,
+        max_position_embeddings=1024, num_labels=3,
+        id2label={0: "contradiction", 1: "neutral", 2: "entailment"},
+        label2id={"contradiction": 0, "neutral": 1, "entailment": 2},
+    )
+    BartForSequenceClassification(config).save_pretrained(path)
+    tokenizer.save_pretrained(path)
+    logging.info("Built the stand-in NLI model in %s.", path)
+    return path
+
+
+def fixture_articles(fixtures, count):
+    """`count` articles parsed from the fixture pages, cycling through them with distinct URLs."""
+    parsed = []
+    for fixture in fixtures:
+        for body_extractor, html in _fixture_pages(fixture)[1]:
+            parsed.append(parsing.extract_article(html, body_extractor))
+    parsed = [article for article in parsed if article["content"]]
+    return [dict(parsed[k % len(parsed)], url=f"https://bench.invalid/{k}/") for k in range(count)] if parsed else []
+
+
+def bench_classify(fixtures, results, count=CLASSIFY_ARTICLES, repeat=REPEAT, model_path=STANDIN_MODEL):
+    import classify
+    from nli import NLIScorer
+    from premises import TOKEN_BUDGET
+
+    scorer = NLIScorer.from_pretrained(build_standin_model(model_path))
+    articles = fixture_articles(fixtures, count)
+    if not articles:
+        logging.warning("No fixture articles to classify.")
+        return
+    for name, token_budget in [("full", 0), (f"budget{TOKEN_BUDGET}", TOKEN_BUDGET)]:
+        # No token cache: every run tokenizes from scratch
+        builder = classify.load_builder(scorer, token_budget, use_cache=False)
+        best = None
+        for _ in range(repeat):
+            pending = [dict(article) for article in articles]
+            start = time.perf_counter()
+            classify.classify_articles(pending, scorer, builder=builder)
+            seconds = time.perf_counter() - start
+            best = seconds if best is None else min(best, seconds)
+        _result(results, f"classify.{name}.articles_per_second", len(articles) / best, "articles/s", "higher")
+
+
+WORDS = (
+    "housing market home buyers sellers condo apartment rent mortgage rates lender loan office tower "
+    "retail lease developer zoning permit city council boston brookline cambridge somerville quincy "
+    "manhattan brooklyn queens listing price inventory sale broker agent property tax assessment "
+    "investment fund portfolio commercial residential luxury affordable units construction tenant "
+    "landlord eviction court lawsuit technology platform startup appraisal renovation kitchen"
+).split()
+
+
+def synthetic_corpus(size, labels, seed=0):
+    """`size` article dicts shaped like the dashboard's corpus, with random text, dates and scores."""
+    rng = random.Random(seed)
+    outlets = [site["site_name"] for site in SITES]
+    newest = datetime(2025, 3, 1)
+    articles = []
+    for k in range(size):
+        published = newest - timedelta(days=rng.randrange(3 * 365))
+        article = {
+            "url": f"https://bench.invalid/{published:%Y/%m/%d}/story-{k}/",
+            # A few articles have no usable date, as in the store
+            "pub_date": published.isoformat() if rng.random() > 0.02 else "",
+            "hed": " ".join(rng.choices(WORDS, k=8)).capitalize(),
+            "subhead": " ".join(rng.choices(WORDS, k=16)).capitalize(),
+            "content": " ".join(rng.choices(WORDS, k=150)),
+            "Outlet": rng.choice(outlets),
+            "classifications": {label: rng.random() for label in labels},
+        }
+        if k and rng.random() < 0.05:
+            article["duplicate_of"] = articles[rng.randrange(k)]["url"]
+        articles.append(article)
+    return articles
+
+
+def _best_seconds(function, repeat):
+    """Shortest of `repeat` timed calls, in seconds, and the last call's result."""
+    best = result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, result
+
+
+def _median_ms(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def bench_dashboard(results, sizes=CORPUS_SIZES, repeat=DASHBOARD_REPEAT, build_repeat=REPEAT):
+    from classify import CANDIDATE_LABELS
+
+    label = CANDIDATE_LABELS[0]
+    for size in sizes:
+        # The dashboard starts from the JSON text of articles.json
+        data = json.dumps(synthetic_corpus(size, CANDIDATE_LABELS))
+        seconds, index = _best_seconds(lambda: ArticleIndex(prepare_articles(json.loads(data))), build_repeat)
+        _result(results, f"dashboard.{size}.load_seconds", seconds, "s", "lower")
+
+        # A fresh index each time; the last one is searched below
+        search = best = None
+        for _ in range(build_repeat):
+            if search is not None:
+                search.close()
+            search = SearchIndex(":memory:")
+            start = time.perf_counter()
+            search.sync(index.articles)
+            seconds = time.perf_counter() - start
+            best = seconds if best is None else min(best, seconds)
+        _result(results, f"dashboard.{size}.search_index_seconds", best, "s", "lower")
+
+        _, latest = index.date_bounds()
+        date_range = (latest - 180 * 86400, latest)
+        filters = {"outlet": index.outlets[0], "date_range": date_range, "min_scores": {label: 0.5},
+                   "hide_duplicates": True}
+        rows = index.select(**filters)
+        everything = index.select()
+        _result(results, f"dashboard.{size}.filter_ms", _median_ms(lambda: index.select(**filters), repeat),
+                "ms", "lower")
+        _result(results, f"dashboard.{size}.sort_date_ms",
+                _median_ms(lambda: index.order(everything, "Publication Date", limit=25), repeat), "ms", "lower")
+        _result(results, f"dashboard.{size}.sort_score_ms",
+                _median_ms(lambda: index.order(rows, "Classification Score", label=label, limit=25), repeat),
+                "ms", "lower")
+        _result(results, f"dashboard.{size}.search_ms",
+                _median_ms(lambda: search.search("mortgage rates boston"), repeat), "ms", "lower")
+        # Restricted to the filtered rows, as the dashboard searches them
+        row_ids = search.doc_ids(article["url"] for article in index.articles)
+        _result(results, f"dashboard.{size}.search_filtered_ms",
+                _median_ms(lambda: search.search("mortgage rates boston", ids=[row_ids[row] for row in rows]),
+                           repeat), "ms", "lower")
+        search.close()
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """Print every result next to its baseline; returns the names of the regressions."""
+    regressions = []
+    print(f"{'benchmark':<44}{'value':>12}{'baseline':>12}{'change':>9}  unit")
+    for name, result in results.items():
+        value = result["value"]
+        base = baseline.get(name, {}).get("value")
+        if not base:
+            print(f"{name:<44}{value:>12.4g}{'-':>12}{'':>9}  {result['unit']}")
+            continue
+        change = value / base - 1
+        worse = -change if result["better"] == "higher" else change
+        flag = ""
+        noise = result["unit"] in TIME_UNITS and abs(value - base) * TIME_UNITS[result["unit"]] < NOISE_FLOOR
+        if worse > threshold and not noise:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<44}{value:>12.4g}{base:>12.4g}{change:>+9.1%}  {result['unit']}{flag}")
+    return regressions
+
+
+def machine():
+    return {"python": platform.python_version(), "platform": platform.platform(),
+            "processor": platform.processor(), "cpus": os.cpu_count()}
+
+
+def run(args):
+    fixtures = benchfixtures.load_fixtures(args.fixtures)
+    if not fixtures and set(args.suites) & {"scrape", "parse", "classify"}:
+        sys.exit(f"No fixtures in {args.fixtures}; run `python benchfixtures.py record` (or synthesize) first.")
+
+    results = {}
+    started = time.time()
+    for suite in args.suites:
+        logging.info("Running the %s benchmarks.", suite)
+        if suite == "scrape":
+            bench_scrape(fixtures, results, args.repeat, args.latency)
+        elif suite == "parse":
+            bench_parse(fixtures, results, args.repeat)
+        elif suite == "classify":
+            bench_classify(fixtures, results, args.classify_articles, args.repeat)
+        else:
+            bench_dashboard(results, args.sizes, build_repeat=args.repeat)
+
+    run_record = {
+        "started_at": datetime.fromtimestamp(started, timezone.utc).isoformat(timespec="seconds"),
+        "duration_seconds": round(time.time() - started, 3),
+        "machine": machine(),
+        "fixtures": {fixture["site_name"]: fixture["source"] for fixture in fixtures},
+        "results": results,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ") + ".json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(run_record, f, indent=2)
+        f.write("\n")
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline_record = json.load(f)
+        baseline = baseline_record["results"]
+        if baseline_record.get("machine") != run_record["machine"]:
+            print(f"Note: {args.baseline} was recorded on a different machine.")
+    regressions = compare(results, baseline, args.threshold)
+    print(f"Results written to {path}.")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(run_record, f, indent=2)
+            f.write("\n")
+        print(f"Saved as the baseline in {args.baseline}.")
+    elif regressions:
+        print(f"{len(regressions)} results are more than {args.threshold:.0%} worse than the baseline.")
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline scraper, classifier and dashboard benchmarks.")
+    parser.add_argument("--suite", action="append", dest="suites", choices=SUITES,
+                        help="Only run this suite (may be repeated). Defaults to every suite.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=CORPUS_SIZES,
+                        help="Synthetic corpus sizes for the dashboard suite.")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="Timed runs per measurement; the best counts.")
+    parser.add_argument("--latency", type=float, default=benchfixtures.LATENCY,
+                        help="Simulated round trip of the fixture server, in seconds.")
+    parser.add_argument("--classify-articles", type=int, default=CLASSIFY_ARTICLES,
+                        help="Articles classified per run of the classify suite.")
+    parser.add_argument("--fixtures", default=benchfixtures.FIXTURES_DIR, help="Fixture directory.")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline results to compare with.")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="Fraction by which a result may be worse than the baseline.")
+    parser.add_argument("--save-baseline", action="store_true", help="Save this run as the baseline.")
+    args = parser.parse_args()
+    args.suites = args.suites or SUITES
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s %(levelname)s: %(message)s', force=True)
+    # Progress bars would only add noise to the timings
+    os.environ["TQDM_DISABLE"] = "1"
+    sys.exit(run(args))
+
+
+if __name__ == "__main__":
+    main()
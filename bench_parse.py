@@ -0,0 +1,81 @@
+import sys
+import time
+import argparse
+from html import escape
+
+import parsing
+import store
+
+# Compare parse throughput and output parity of the installed HTML backends.
+#
+#   python bench_parse.py                     # synthetic pages built from the article store
+#   python bench_parse.py page1.html page2.html
+#
+# bench.py tracks parse speed on the recorded outlet pages against a baseline.
+
+
+def synthetic_pages(limit):
+    """Article-like pages built from stored articles, so the benchmark runs offline."""
+    pages = []
+    for article in store.read_articles()[:limit]:
+        paragraphs = "".join(f"<p>{escape(line)}</p>" for line in article.get("content", "").split("\n"))
+        links = "".join(f'<li><a href="/{i}/2025/03/10/real-estate/story-{i}/">Story {i}</a></li>'
+                        for i in range(40))
+        page = (
+            "<!DOCTYPE html><html><head><title>t</title>"
+            "<script>window.dataLayer = [];</script><style>p { margin: 0 }</style></head>"
+            f"<body><nav><ul>{links}</ul></nav><h1>{escape(article.get('hed', ''))}</h1>"
+            f"<h2>{escape(article.get('subhead', ''))}</h2>"
+            f'<div id="article-body">{paragraphs}</div><footer><p>Footer</p></footer></body></html>'
+        )
+        pages.append(page.encode("utf-8"))
+    return pages
+
+
+def run_backend(backend, pages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        outputs = []
+        for page in pages:
+            outputs.append((
+                parsing.extract_hrefs(page, backend),
+                parsing.extract_article(page, "article_body", backend),
+                parsing.extract_article(page, "paragraphs", backend),
+            ))
+    return time.perf_counter() - start, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the HTML parser backends.")
+    parser.add_argument("files", nargs="*", help="HTML files to parse (default: synthetic pages)")
+    parser.add_argument("--limit", type=int, default=200, help="Number of synthetic pages")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.files:
+        pages = []
+        for path in args.files:
+            with open(path, "rb") as f:
+                pages.append(f.read())
+    else:
+        pages = synthetic_pages(args.limit)
+    if not pages:
+        sys.exit("No pages to parse.")
+    total_mb = sum(len(page) for page in pages) * args.repeat / 1e6
+
+    print(f"{len(pages)} pages x {args.repeat} repeats, {total_mb:.1f} MB parsed per backend")
+    print(f"{'backend':<12}{'seconds':>10}{'pages/s':>10}{'MB/s':>8}{'speedup':>9}  parity")
+    reference = None
+    baseline_seconds = None
+    for name in sorted(parsing.available_backends(), key=lambda n: n != "bs4"):
+        seconds, outputs = run_backend(parsing.get_backend(name), pages, args.repeat)
+        if reference is None:
+            reference, baseline_seconds = outputs, seconds
+        mismatches = sum(1 for a, b in zip(reference, outputs) if a != b)
+        parity = "identical" if not mismatches else f"{mismatches} pages differ"
+        print(f"{name:<12}{seconds:>10.3f}{len(pages) * args.repeat / seconds:>10.1f}"
+              f"{total_mb / seconds:>8.2f}{baseline_seconds / seconds:>8.1f}x  {parity}")
+
+
+if __name__ == "__main__":
+    main()
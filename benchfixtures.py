@@ -0,0 +1,228 @@
+import os
+import re
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from html import escape
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import store
+from sites import SITES, get_site
+
+# Recorded outlet pages for bench.py, replayed from a local HTTP server.
+#
+# Each outlet has a directory under FIXTURES_DIR holding its listing page, the
+# article pages it links to and a manifest.json mapping request paths to
+# files. FixtureServer serves one outlet on its own 127.0.0.1 port, so the
+# fetcher's per-host limits behave as they do against the live sites, and its
+# site() method returns a copy of the outlet's sites.py entry pointed at it.
+# Absolute links to the live outlet are rewritten to the server as pages are
+# loaded.
+#
+#   python benchfixtures.py record        # save the live pages (needs network)
+#   python benchfixtures.py synthesize    # build pages from the article store
+
+FIXTURES_DIR = "bench_fixtures"
+# Article pages kept per outlet
+ARTICLES_PER_SITE = 30
+# Simulated network round trip added to every response, in seconds
+LATENCY = 0.02
+
+
+def site_slug(site_name):
+    return re.sub(r"[^a-z0-9]+", "-", site_name.lower()).strip("-")
+
+
+def request_key(url):
+    """Path and query of a URL, which is what the fixture server is asked for."""
+    parts = urlsplit(url)
+    return (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+
+
+def _write_fixture(site, pages, source, out_dir):
+    """Write pages ({url: html bytes}, listing first) and the outlet's manifest."""
+    site_dir = os.path.join(out_dir, site_slug(site["site_name"]))
+    os.makedirs(site_dir, exist_ok=True)
+    manifest = {
+        "site_name": site["site_name"],
+        "base_url": site["base_url"],
+        "scrape_url": site["scrape_url"],
+        "source": source,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "pages": {},
+    }
+    for number, (url, html) in enumerate(pages.items()):
+        filename = "listing.html" if number == 0 else f"article-{number:03d}.html"
+        with open(os.path.join(site_dir, filename), "wb") as f:
+            f.write(html)
+        manifest["pages"][request_key(url)] = filename
+    with open(os.path.join(site_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    logging.info("[%s] Wrote %d %s fixture pages to %s.", site["site_name"], len(pages), source, site_dir)
+
+
+def record(sites=SITES, out_dir=FIXTURES_DIR, limit=ARTICLES_PER_SITE):
+    """Save each outlet's live listing page and up to `limit` of its articles."""
+    # Imported here: synthesizing and replaying fixtures needs no network code
+    import scrape
+    from fetcher import Fetcher
+
+    with Fetcher() as fetcher:
+        for site in sites:
+            response = fetcher.get(site["scrape_url"])
+            response.raise_for_status()
+            pages = {site["scrape_url"]: response.content}
+            links = scrape.extract_links(site, response.content)[:limit]
+            for url, article_response in fetcher.fetch_all(links):
+                if article_response is not None and article_response.status_code == 200:
+                    pages[url] = article_response.content
+            _write_fixture(site, pages, "recorded", out_dir)
+
+
+def _boilerplate(site, rng):
+    # Navigation, inline scripts and a footer of roughly the weight of the live pages
+    sections = ["news", "business", "metro", "politics", "sports", "lifestyle", "opinion", "arts"]
+    nav = "".join(f'<li><a href="{site["base_url"]}/{section}/">{section.title()}</a></li>' for section in sections)
+    config = json.dumps({"ads": [{"slot": f"ad-{k}", "sizes": [[300, 250], [728, 90]], "targeting":
+                                  {"section": rng.choice(sections), "position": k}} for k in range(40)]})
+    head = (f"<head><meta charset=\"utf-8\"><title>{escape(site['site_name'])}</title>"
+            f"<script>window.__CONFIG__ = {config};</script>"
+            "<style>body { font-family: serif } .story { margin: 0 auto }</style></head>")
+    footer = "<footer>" + "".join(f'<p><a href="{site["base_url"]}/about/{k}/">About {k}</a></p>' for k in range(12))
+    return head, f"<header><nav><ul>{nav}</ul></nav></header>", footer + "</footer>"
+
+
+def _listing_html(site, articles, rng):
+    head, header, footer = _boilerplate(site, rng)
+    items = []
+    for article in articles:
+        # The Globe links articles relatively, the other outlets absolutely
+        url = article["url"]
+        if site["body_extractor"] == "article_body":
+            url = request_key(url)
+        items.append(f'<li class="story"><a href="{escape(url)}"><h3>{escape(article.get("hed", ""))}</h3></a>'
+                     f"<p>{escape(article.get('subhead', ''))}</p></li>")
+    return (f"<!DOCTYPE html><html>{head}<body>{header}<main><h1>Real Estate</h1>"
+            f"<ul>{''.join(items)}</ul></main>{footer}</body></html>").encode("utf-8")
+
+
+def _article_html(site, article, rng):
+    head, header, footer = _boilerplate(site, rng)
+    paragraphs = "".join(f"<p>{escape(line)}</p>" for line in article.get("content", "").split("\n") if line)
+    if site["body_extractor"] == "article_body":
+        body = f'<div id="article-body">{paragraphs}</div>'
+    else:
+        body = f'<div class="entry-content">{paragraphs}</div>'
+    # Other <p> text on the page ends up in "paragraphs" content, as it does live
+    return (f"<!DOCTYPE html><html>{head}<body>{header}<article><h1>{escape(article.get('hed', ''))}</h1>"
+            f"<h2>{escape(article.get('subhead', ''))}</h2>{body}</article>{footer}</body></html>").encode("utf-8")
+
+
+def synthesize(sites=SITES, out_dir=FIXTURES_DIR, limit=ARTICLES_PER_SITE, store_file=store.STORE_FILE):
+    """Build each outlet's fixture pages in its markup from articles already in the store."""
+    rng = random.Random(0)
+    articles = store.read_articles(store_file)
+    for site in sites:
+        mine = [article for article in articles if article.get("Outlet") == site["site_name"]][:limit]
+        pages = {site["scrape_url"]: _listing_html(site, mine, rng)}
+        for article in mine:
+            pages[article["url"]] = _article_html(site, article, rng)
+        _write_fixture(site, pages, "synthesized", out_dir)
+
+
+def load_fixtures(out_dir=FIXTURES_DIR):
+    """Manifests of every outlet with fixtures, in sites.py order."""
+    fixtures = []
+    for site in SITES:
+        site_dir = os.path.join(out_dir, site_slug(site["site_name"]))
+        path = os.path.join(site_dir, "manifest.json")
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        manifest["pages"] = {key: os.path.join(site_dir, filename) for key, filename in manifest["pages"].items()}
+        fixtures.append(manifest)
+    return fixtures
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        pages = self.server.pages
+        # Article links reach the fetcher canonicalized, without their query string
+        body = pages.get(self.path, pages.get(self.path.split("?", 1)[0]))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug("%s - %s", self.address_string(), format % args)
+
+
+class FixtureServer(ThreadingHTTPServer):
+    """Serves one outlet's fixture pages on a free 127.0.0.1 port, in a background thread."""
+
+    daemon_threads = True
+
+    def __init__(self, fixture, latency=LATENCY):
+        super().__init__(("127.0.0.1", 0), FixtureHandler)
+        self.fixture = fixture
+        self.latency = latency
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+        self.pages = {}
+        for key, path in fixture["pages"].items():
+            with open(path, "rb") as f:
+                html = f.read()
+            self.pages[key] = html.replace(fixture["base_url"].encode("utf-8"), self.url.encode("utf-8"))
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+    def site(self):
+        """The outlet's sites.py entry, pointed at this server."""
+        site = dict(get_site(self.fixture["site_name"]))
+        site["base_url"] = self.url
+        site["scrape_url"] = self.url + request_key(self.fixture["scrape_url"])
+        return site
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record or synthesize the HTML fixtures replayed by bench.py.")
+    parser.add_argument("command", choices=["record", "synthesize"],
+                        help="record: save the live pages; synthesize: build pages from the article store.")
+    parser.add_argument("--site", action="append", dest="sites", metavar="SITE_NAME",
+                        help="Only this outlet (may be repeated). Defaults to every outlet in sites.py.")
+    parser.add_argument("--limit", type=int, default=ARTICLES_PER_SITE, help="Article pages per outlet.")
+    parser.add_argument("--out", default=FIXTURES_DIR, help="Fixture directory.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+    sites = [get_site(name) for name in args.sites] if args.sites else SITES
+    if args.command == "record":
+        record(sites, args.out, args.limit)
+    else:
+        synthesize(sites, args.out, args.limit)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+
+# On-disk cache of zero-shot scores.
+#
+# One row per (content hash, model id, label, hypothesis template), so a score
+# is only ever computed once for a given text and model configuration. Adding a
+# label costs one NLI pass per article, and re-scraped articles with identical
+# text are never re-inferred. Least recently used rows are evicted once the
+# cache holds more than max_entries scores.
+
+CACHE_FILE = os.path.join(".cache", "classify", "scores.sqlite")
+MAX_ENTRIES = 1_000_000
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ClassificationCache:
+    def __init__(self, path=CACHE_FILE, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # True when the cache starts out empty, e.g. on a fresh CI runner
+        self.is_new = not os.path.exists(path)
+        # Used by one thread at a time, but not always the one that opened it
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            " content_hash TEXT NOT NULL,"
+            " model TEXT NOT NULL,"
+            " label TEXT NOT NULL,"
+            " template TEXT NOT NULL,"
+            " score REAL NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (content_hash, model, label, template))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS scores_last_used ON scores (last_used)")
+        self.conn.commit()
+
+    def get(self, digest, model, template, labels):
+        """Return {label: score} for the labels already cached for this text."""
+        labels = list(labels)
+        if not labels:
+            return {}
+        placeholders = ",".join("?" * len(labels))
+        rows = self.conn.execute(
+            f"SELECT label, score FROM scores WHERE content_hash = ? AND model = ? AND template = ?"
+            f" AND label IN ({placeholders})",
+            [digest, model, template] + labels,
+        ).fetchall()
+        if rows:
+            self.conn.executemany(
+                "UPDATE scores SET last_used = ? WHERE content_hash = ? AND model = ? AND label = ? AND template = ?",
+                [(time.time(), digest, model, label, template) for label, _ in rows],
+            )
+        return dict(rows)
+
+    def put(self, entries, replace=True):
+        """Store (content_hash, model, label, template, score) tuples."""
+        now = time.time()
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        self.conn.executemany(
+            f"{verb} INTO scores (content_hash, model, label, template, score, last_used)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            [entry + (now,) for entry in entries],
+        )
+        self.evict()
+
+    def evict(self):
+        count = self.conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self.conn.execute(
+                "DELETE FROM scores WHERE rowid IN"
+                " (SELECT rowid FROM scores ORDER BY last_used LIMIT ?)", (excess,))
+            logging.info("Evicted %d cached classification scores.", excess)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
@@ -0,0 +1,230 @@
+import os
+import json
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import requests
+
+import nli
+
+# Long-running classifier service.
+#
+# Loading torch, transformers and bart-large-mnli dominates a classify.py run
+# that only has a handful of new articles. This service loads the model once
+# and keeps it warm; classify.py uses it automatically when it is running and
+# serves the same model and backend, and loads the model in-process otherwise.
+# If the service errors or stops answering mid-run, the client loads the model
+# in-process and scores the rest there.
+#
+#   python classifier_service.py [--model ...] [--backend ...] [--port 8787]
+#
+# Endpoints (JSON):
+#   GET  /health  -> {"model": ..., "hypothesis_template": ...}
+#   POST /score   {"pairs": [[text, label], ...], "batch_size": 8} -> {"scores": [...]}
+#                 (text may also be a list of premise token ids; a malformed body gets a 400)
+
+SERVICE_URL = os.environ.get("CLASSIFIER_SERVICE_URL", "http://127.0.0.1:8787")
+
+# Pairs sent per request by the client
+REQUEST_PAIRS = 512
+# (connect, read) timeouts of a /score request; a wedged service must not hang classify.py
+SCORE_TIMEOUT = (5, 300)
+
+
+def _valid_pair(pair):
+    if not isinstance(pair, list) or len(pair) != 2:
+        return False
+    text, label = pair
+    if isinstance(text, list):
+        text_ok = all(isinstance(token, int) and not isinstance(token, bool) for token in text)
+    else:
+        text_ok = isinstance(text, str)
+    return text_ok and isinstance(label, str)
+
+
+class ClassifierHandler(BaseHTTPRequestHandler):
+    scorer = None
+    # One forward pass at a time; torch already spreads each batch over the cores
+    lock = threading.Lock()
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._send_json(404, {"error": "not found"})
+            return
+        self._send_json(200, {
+            "model": self.scorer.model_id,
+            "hypothesis_template": self.scorer.hypothesis_template,
+        })
+
+    def do_POST(self):
+        if self.path != "/score":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            pairs = request["pairs"]
+            batch_size = int(request.get("batch_size", nli.BATCH_SIZE))
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {"error": f"bad request: {e}"})
+            return
+        # Reject what the scorer would choke on, so a client bug is not reported as a service failure
+        if not isinstance(pairs, list) or not all(_valid_pair(pair) for pair in pairs):
+            self._send_json(400, {"error": "bad request: pairs must be [text or token ids, label] pairs"})
+            return
+        if batch_size < 1:
+            self._send_json(400, {"error": "bad request: batch_size must be positive"})
+            return
+
+        try:
+            with self.lock:
+                # Tokenize each distinct text once, however many labels it is paired with.
+                # Premises sent as token id lists (see premises.py) are used as they are.
+                premises = {}
+                keys = [tuple(text) if isinstance(text, list) else text for text, _ in pairs]
+                for key in keys:
+                    if key not in premises:
+                        premises[key] = list(key) if isinstance(key, tuple) else self.scorer.encode_premise(key)
+                scores = self.scorer.score_pairs([(premises[key], label) for key, (_, label) in zip(keys, pairs)],
+                                                 batch_size)
+        except Exception as e:
+            logging.exception("Scoring %d pairs failed: %s", len(pairs), e)
+            self._send_json(500, {"error": f"scoring failed: {e}"})
+            return
+        logging.info("Scored %d pairs for %d texts.", len(pairs), len(premises))
+        self._send_json(200, {"scores": scores})
+
+    def log_message(self, format, *args):
+        logging.debug("%s - %s", self.address_string(), format % args)
+
+
+class ServiceClient:
+    """Scorer interface backed by a running classifier service.
+
+    Premises are sent as text and tokenized by the service, so the client
+    never imports torch or transformers. Only token-budgeted premises need
+    the tokenizer, which is then loaded on first use. If a request fails and
+    `fallback` was given, it is called to load an in-process scorer, which
+    scores everything from then on. Requests the service rejects (4xx) raise.
+    """
+
+    def __init__(self, url, info, fallback=None):
+        self.url = url.rstrip("/")
+        self.model_id = info["model"]
+        self.hypothesis_template = info["hypothesis_template"]
+        self.session = requests.Session()
+        self.fallback = fallback
+        self._local = None
+        self._tokenizer = None
+
+    @property
+    def tokenizer(self):
+        if self._local is not None:
+            return self._local.tokenizer
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+
+            self._tokenizer = AutoTokenizer.from_pretrained(self.model_id.split("@")[0])
+        return self._tokenizer
+
+    def encode_premise(self, text):
+        return text if self._local is None else self._local.encode_premise(text)
+
+    def _score_locally(self, pairs, batch_size):
+        # Text premises were left for the service to tokenize
+        pairs = [(self._local.encode_premise(premise) if isinstance(premise, str) else premise, label)
+                 for premise, label in pairs]
+        return self._local.score_pairs(pairs, batch_size)
+
+    def score_pairs(self, pairs, batch_size=nli.BATCH_SIZE):
+        pairs = [list(pair) for pair in pairs]
+        scores = []
+        for start in range(0, len(pairs), REQUEST_PAIRS):
+            if self._local is not None:
+                return scores + self._score_locally(pairs[start:], batch_size)
+            try:
+                response = self.session.post(f"{self.url}/score", json={
+                    "pairs": pairs[start:start + REQUEST_PAIRS],
+                    "batch_size": batch_size,
+                }, timeout=SCORE_TIMEOUT)
+                response.raise_for_status()
+                scores.extend(response.json()["scores"])
+            except (requests.RequestException, ValueError) as e:
+                # A 4xx is a bad request, which the in-process scorer would not score either
+                rejected = isinstance(e, requests.HTTPError) and 400 <= e.response.status_code < 500
+                if self.fallback is None or rejected:
+                    raise
+                logging.error("Classifier service at %s failed (%s); loading the model in this process.",
+                              self.url, e)
+                self._local = self.fallback()
+                return scores + self._score_locally(pairs[start:], batch_size)
+        return scores
+
+    def classify(self, texts, labels, batch_size=nli.BATCH_SIZE):
+        return nli.NLIScorer.classify(self, texts, labels, batch_size)
+
+    def close(self):
+        self.session.close()
+        if self._local is not None and hasattr(self._local, "close"):
+            self._local.close()
+
+
+def connect(url=SERVICE_URL, model_id=None, hypothesis_template=nli.HYPOTHESIS_TEMPLATE, timeout=0.5,
+            fallback=None):
+    """Return a ServiceClient if a service serving this model is up, else None.
+
+    fallback, if given, loads an in-process scorer for the client to use once
+    the service fails.
+    """
+    try:
+        response = requests.get(f"{url.rstrip('/')}/health", timeout=timeout)
+        response.raise_for_status()
+        info = response.json()
+    except (requests.RequestException, ValueError):
+        return None
+    if model_id and (info.get("model"), info.get("hypothesis_template")) != (model_id, hypothesis_template):
+        logging.warning("Classifier service at %s serves %s; %s was requested. Not using it.",
+                        url, info.get("model"), model_id)
+        return None
+    logging.info("Using classifier service at %s (%s).", url, info["model"])
+    return ServiceClient(url, info, fallback)
+
+
+def main():
+    default = urlsplit(SERVICE_URL)
+    parser = argparse.ArgumentParser(description="Serve the zero-shot classifier over HTTP.")
+    parser.add_argument("--model", default=nli.MODEL_ID)
+    parser.add_argument("--backend", choices=nli.BACKENDS, default="torch")
+    parser.add_argument("--host", default=default.hostname or "127.0.0.1")
+    parser.add_argument("--port", type=int, default=default.port or 8787)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        filename='classifier_service.log',
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s: %(message)s'
+    )
+    ClassifierHandler.scorer = nli.load_scorer(args.model, args.backend)
+    server = ThreadingHTTPServer((args.host, args.port), ClassifierHandler)
+    logging.info("Classifier service listening on %s:%d.", args.host, args.port)
+    print(f"Classifier service listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,16 @@
-import os
-import json
+import time
 import logging
-from transformers import pipeline
+import argparse
 from tqdm import tqdm  # Import tqdm for progress bars
 
+import store
+import metrics
+import classifier_service
+from classcache import ClassificationCache, content_hash
+from nli import MODEL_ID, BATCH_SIZE, HYPOTHESIS_TEMPLATE, BACKENDS, ScorerPool, backend_model_key, load_scorer
+from embeddings import EMBEDDING_MODEL, UNCERTAINTY_BAND, EmbeddingScorer, is_uncertain
+from premises import TOKEN_BUDGET, PremiseBuilder, TokenCache
+
 # Set up logging to a file named 'classify.log'
 logging.basicConfig(
     filename='classify.log',
@@ -11,8 +18,8 @@ logging.basicConfig(
     format='%(asctime)s %(levelname)s: %(message)s'
 )
 
-# Path to the JSON file containing scraped articles
-JSON_FILE = "articles.json"
+# Append-only store containing scraped articles
+STORE_FILE = store.STORE_FILE
 
 # Define candidate subcategories for real estate articles.
 CANDIDATE_LABELS = [
@@ -25,58 +32,430 @@ CANDIDATE_LABELS = [
     "Real Estate Investment"
 ]
 
-def load_articles(json_file):
-    if os.path.exists(json_file):
-        with open(json_file, "r") as f:
-            articles = json.load(f)
-        logging.info("Loaded %d articles from %s.", len(articles), json_file)
-        return articles
-    else:
-        logging.info("No articles file found at %s. Exiting.", json_file)
-        return []
+# Articles classified before the model and template were recorded used these
+LEGACY_CLASSIFIER = {"model": MODEL_ID, "hypothesis_template": HYPOTHESIS_TEMPLATE}
+
+def load_articles(store_file):
+    articles = store.load_articles(store_file)
+    if not articles:
+        logging.info("No articles found in %s. Exiting.", store_file)
+    return articles
+
+def classify_articles(articles, classifier, batch_size=BATCH_SIZE, cache=None, builder=None, canonical=None):
+    # An NLIScorer (or ScorerPool) classifies every pending article in
+    # length-bucketed batches; a plain zero-shot pipeline is called once per article.
+    if hasattr(classifier, "score_pairs"):
+        return classify_articles_batched(articles, classifier, batch_size, cache, builder, canonical)
 
-def classify_articles(articles, classifier):
     num_classified = 0
     # Wrap the articles loop with tqdm for a progress bar
     for article in tqdm(articles, desc="Classifying articles"):
         # If an article already has classifications, skip it.
         if "classifications" in article:
-            logging.info("Article already classified: %s", article.get("url", "No URL"))
+            logging.debug("Article already classified: %s", article.get("url", "No URL"))
             continue
 
         text = article.get("content", "")
         if not text:
             article["classifications"] = {}
-            logging.info("No content found for article: %s", article.get("url", "No URL"))
+            logging.debug("No content found for article: %s", article.get("url", "No URL"))
             continue
 
-        logging.info("Classifying article: %s", article.get("url", "No URL"))
-        result = classifier(text, candidate_labels=CANDIDATE_LABELS, multi_label=True)
+        logging.debug("Classifying article: %s", article.get("url", "No URL"))
+        with metrics.timer("inference_seconds_per_article", mode="sequential"):
+            result = classifier(text, candidate_labels=CANDIDATE_LABELS, multi_label=True)
         classifications = {label: score for label, score in zip(result["labels"], result["scores"])}
         article["classifications"] = classifications
-        logging.info("Assigned classifications: %s", classifications)
+        logging.debug("Assigned classifications: %s", classifications)
         num_classified += 1
 
     logging.info("Classified %d new articles.", num_classified)
     return articles
 
-def save_articles(articles, json_file):
-    with open(json_file, "w") as f:
-        json.dump(articles, f, indent=4)
-    logging.info("Saved updated articles to %s.", json_file)
+def classifier_config(model_id, hypothesis_template=HYPOTHESIS_TEMPLATE, input_spec=None):
+    config = {"model": model_id, "hypothesis_template": hypothesis_template}
+    # Scores of token-budgeted premises are not interchangeable with full-content ones
+    if input_spec:
+        config["input"] = input_spec
+    return config
+
+def is_current(article, config, labels=CANDIDATE_LABELS):
+    # Up to date when the scores came from this model and template and cover exactly these labels
+    if "classifications" not in article:
+        return False
+    if not article.get("content", ""):
+        return True
+    return (article.get("classifier", LEGACY_CLASSIFIER) == config
+            and set(article["classifications"]) == set(labels))
+
+def article_digest(article, builder=None):
+    return builder.digest(article) if builder is not None else content_hash(article["content"])
+
+def seed_cache(cache, articles, config, labels=CANDIDATE_LABELS, builder=None):
+    # Fill an empty cache from scores already stored on the articles
+    entries = []
+    for article in articles:
+        if article.get("content") and article.get("classifier", LEGACY_CLASSIFIER) == config:
+            digest = article_digest(article, builder)
+            entries.extend((digest, config["model"], label, config["hypothesis_template"], score)
+                           for label, score in article.get("classifications", {}).items() if label in labels)
+    cache.put(entries, replace=False)
+    logging.info("Seeded classification cache with %d stored scores.", len(entries))
+
+def classify_articles_batched(articles, scorer, batch_size=BATCH_SIZE, cache=None, builder=None, canonical=None):
+    # With a PremiseBuilder each article is scored on its token-budgeted lead
+    # (plus any windows) instead of the full content. canonical, if given, looks
+    # up stored articles by URL so near-duplicates (see dedup.py) can copy the
+    # scores of their cluster's canonical article.
+    config = classifier_config(scorer.model_id, scorer.hypothesis_template, builder and builder.spec)
+    model, template = config["model"], config["hypothesis_template"]
+
+    pending = []
+    for article in articles:
+        if is_current(article, config):
+            continue
+        if not article.get("content", ""):
+            article["classifications"] = {}
+            article["classifier"] = config
+            logging.debug("No content found for article: %s", article.get("url", "No URL"))
+            continue
+        pending.append(article)
+
+    # Near-duplicates whose canonical article is up to date, or about to be
+    # scored in this batch, copy its scores instead of going through the model.
+    copies = []
+    if canonical is not None:
+        in_batch = {article["url"]: article for article in pending if not article.get("duplicate_of")}
+        originals = []
+        for article in pending:
+            source = None
+            if article.get("duplicate_of"):
+                source = in_batch.get(article["duplicate_of"]) or canonical(article["duplicate_of"])
+                if source is not None and source["url"] not in in_batch and not is_current(source, config):
+                    source = None
+            if source is not None:
+                copies.append((article, source))
+            else:
+                originals.append(article)
+        pending = originals
+
+    # Reuse scores the article already has from this model, then cached ones;
+    # only the (text, label) pairs left over go through the model.
+    known = []
+    premises = {}
+    pairs = []
+    pair_index = {}
+    for article in pending:
+        digest = article_digest(article, builder)
+        scores = {}
+        if article.get("classifier", LEGACY_CLASSIFIER) == config:
+            scores.update({label: score for label, score in article.get("classifications", {}).items()
+                           if label in CANDIDATE_LABELS})
+        missing = [label for label in CANDIDATE_LABELS if label not in scores]
+        if cache is not None and missing:
+            scores.update(cache.get(digest, model, template, missing))
+        known.append((digest, scores))
+
+        for label in CANDIDATE_LABELS:
+            if label not in scores and (digest, label) not in pair_index:
+                if digest not in premises:
+                    premises[digest] = (builder.build(article, digest) if builder is not None
+                                        else [scorer.encode_premise(article["content"])])
+                pair_index[(digest, label)] = len(pairs)
+                pairs.append((digest, label))
+
+    runs = [(premise, label) for digest, label in pairs for premise in premises[digest]]
+    logging.info("Classifying %d articles: %d NLI passes in batches of %d.",
+                 len(pending), len(runs), batch_size)
+    started = time.perf_counter()
+    window_scores = scorer.score_pairs(runs, batch_size)
+    if runs:
+        # One call covers the whole run; spread its time evenly over the articles scored
+        elapsed = time.perf_counter() - started
+        metrics.observe("inference_seconds", elapsed, mode="batched")
+        metrics.inc("nli_passes_total", len(runs))
+        for _ in range(len(pending)):
+            metrics.observe("inference_seconds_per_article", elapsed / len(pending), mode="batched")
+
+    # One score per (text, label), aggregated over the windows of the text
+    results = []
+    position = 0
+    for digest, label in pairs:
+        count = len(premises[digest])
+        scores = window_scores[position:position + count]
+        results.append(builder.combine(scores) if builder is not None else scores[0])
+        position += count
+    if builder is not None and builder.cache is not None:
+        builder.cache.commit()
+    if cache is not None:
+        cache.put([(digest, model, label, template, score)
+                   for (digest, label), score in zip(pairs, results)])
+
+    # Scatter the scores back into each article, highest first like the pipeline
+    for article, (digest, scores) in zip(pending, known):
+        for label in CANDIDATE_LABELS:
+            if label not in scores:
+                scores[label] = results[pair_index[(digest, label)]]
+        article["classifications"] = dict(sorted(scores.items(), key=lambda item: item[1], reverse=True))
+        article["classifier"] = config
+    for article, source in copies:
+        article["classifications"] = dict(source["classifications"])
+        article["classifier"] = config
+
+    logging.info("Classified %d articles; %d near-duplicates reused their canonical's scores.",
+                 len(pending), len(copies))
+    return articles
+
+def tier_config(embedding_model):
+    return {"model": embedding_model, "tier": "embedding"}
+
+def classify_articles_tiered(articles, fast_scorer, load_nli, band=UNCERTAINTY_BAND,
+                             batch_size=BATCH_SIZE, cache=None, load_builder=None):
+    # Score everything with the embedding tier first. Only articles with a label
+    # score inside the uncertainty band go on to NLI; load_nli is called to get
+    # the NLI classifier only if at least one article needs it. load_builder,
+    # if given, is called with that classifier to get its PremiseBuilder.
+    fast_config = tier_config(fast_scorer.model_id)
+    candidates = []
+    for article in articles:
+        if is_current(article, fast_config):
+            continue
+        if not article.get("content", ""):
+            article["classifications"] = {}
+            article["classifier"] = fast_config
+            continue
+        candidates.append(article)
+
+    escalated = []
+    fast_results = fast_scorer.score([article["content"] for article in candidates], CANDIDATE_LABELS)
+    for article, scores in zip(candidates, fast_results):
+        if is_uncertain(scores, band):
+            escalated.append(article)
+        else:
+            article["classifications"] = scores
+            article["classifier"] = fast_config
+
+    logging.info("Fast tier settled %d of %d articles; escalating %d (%.0f%%) to NLI.",
+                 len(candidates) - len(escalated), len(candidates), len(escalated),
+                 100.0 * len(escalated) / max(len(candidates), 1))
+    if escalated:
+        scorer = load_nli()
+        builder = load_builder(scorer) if load_builder is not None else None
+        classify_articles_batched(escalated, scorer, batch_size, cache, builder)
+    return articles
+
+def tier_report(articles, fast_scorer, nli_scorer, band=UNCERTAINTY_BAND, limit=100, labels=CANDIDATE_LABELS):
+    """How often the fast tier escalates, and how far its scores are from full NLI."""
+    sample = [article for article in articles if article.get("content")][:limit]
+    texts = [article["content"] for article in sample]
+    fast = fast_scorer.score(texts, labels)
+    full = nli_scorer.classify(texts, labels)
+
+    def summarize(low, high):
+        settled = [(f, n) for f, n in zip(fast, full) if not is_uncertain(f, (low, high))]
+        diffs = [abs(f[label] - n[label]) for f, n in settled for label in labels]
+        agree = [(f[label] >= 0.5) == (n[label] >= 0.5) for f, n in settled for label in labels]
+        return (1 - len(settled) / max(len(sample), 1),
+                sum(diffs) / len(diffs) if diffs else 0.0,
+                sum(agree) / len(agree) if agree else 1.0)
+
+    print(f"Fast tier {fast_scorer.model_id} against {nli_scorer.model_id} on {len(sample)} articles")
+    print(f"{'band':<14}{'escalated':>10}{'mean abs diff':>15}{'agree@0.5':>11}  (diff/agree over settled articles)")
+    bands = sorted({tuple(band), (0.4, 0.6), (0.3, 0.7), (0.2, 0.8), (0.1, 0.9)})
+    for low, high in bands:
+        escalation, mean_diff, agreement = summarize(low, high)
+        marker = "  <- configured" if (low, high) == tuple(band) else ""
+        print(f"{low:.2f}-{high:.2f}{'':<5}{escalation:>9.0%}{mean_diff:>15.4f}{agreement:>11.1%}{marker}")
+        logging.info("Tier report band %.2f-%.2f: %.0f%% escalated, mean abs diff %.4f, agreement %.1f%%.",
+                     low, high, 100 * escalation, mean_diff, 100 * agreement)
+
+def parity_report(articles, scorer, reference, limit=50, labels=CANDIDATE_LABELS):
+    """Per-label score drift of a scorer against the reference zero-shot pipeline."""
+    sample = [article for article in articles if article.get("content")][:limit]
+    texts = [article["content"] for article in sample]
+    results = scorer.classify(texts, labels)
+
+    drift = {label: [] for label in labels}
+    flips = {label: 0 for label in labels}
+    for text, result in zip(tqdm(texts, desc="Reference pipeline"), results):
+        ref = reference(text, candidate_labels=labels, multi_label=True)
+        for label, ref_score in zip(ref["labels"], ref["scores"]):
+            drift[label].append(abs(result[label] - ref_score))
+            # A flip is a score on the other side of 0.5 from the reference
+            if (result[label] >= 0.5) != (ref_score >= 0.5):
+                flips[label] += 1
+
+    print(f"Score drift of {scorer.model_id} against the reference pipeline on {len(sample)} articles")
+    print(f"{'label':<28}{'mean abs':>10}{'max abs':>10}{'flips@0.5':>11}")
+    for label in labels:
+        values = drift[label] or [0.0]
+        mean_drift = sum(values) / len(values)
+        print(f"{label:<28}{mean_drift:>10.4f}{max(values):>10.4f}{flips[label]:>11}")
+        logging.info("Parity %s: mean abs drift %.4f, max abs drift %.4f, %d flips.",
+                     label, mean_drift, max(values), flips[label])
+    return drift
+
+def save_classifications(articles, store_file):
+    # Append only the classification fields; article bodies are not rewritten
+    updates = []
+    for article in articles:
+        if "classifications" in article:
+            update = {"url": article["url"], "classifications": article["classifications"]}
+            if "classifier" in article:
+                update["classifier"] = article["classifier"]
+            updates.append(update)
+    store.upsert(updates, store_file)
+    logging.info("Saved classifications for %d articles to %s.", len(updates), store_file)
+
+def load_classifier(model_id=MODEL_ID, backend="torch", workers=1, threads_per_worker=None,
+                    service_url=classifier_service.SERVICE_URL, use_service=True):
+    # A warm classifier service skips loading torch and the model altogether;
+    # if it fails mid-run, the client loads the model here instead
+    def load_local():
+        if workers > 1:
+            return ScorerPool(model_id, backend, workers, threads_per_worker)
+        return load_scorer(model_id, backend)
+
+    classifier = None
+    if use_service:
+        classifier = classifier_service.connect(service_url, backend_model_key(model_id, backend),
+                                                fallback=load_local)
+    return classifier if classifier is not None else load_local()
+
+def load_builder(scorer, token_budget=0, windows=0, aggregate="max", use_cache=True):
+    # Without a token budget articles are scored on their full content
+    if not token_budget:
+        return None
+    return PremiseBuilder(scorer, token_budget, windows, aggregate, TokenCache() if use_cache else None)
+
+def add_premise_args(parser):
+    parser.add_argument("--token-budget", type=int, nargs="?", const=TOKEN_BUDGET, default=0, metavar="TOKENS",
+                        help="Score the headline, subhead and lead paragraphs up to this many tokens instead of "
+                             f"the full content (default when given without a value: {TOKEN_BUDGET}).")
+    parser.add_argument("--windows", type=int, default=0,
+                        help="With --token-budget, also score up to this many further chunks of the body.")
+    parser.add_argument("--aggregate", choices=["max", "mean"], default="max",
+                        help="How window scores are combined into one score per label.")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Classify unclassified articles with a zero-shot NLI model.")
+    parser.add_argument("--model", default=MODEL_ID, help="Hugging Face NLI model to use.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="Premise/hypothesis pairs per forward pass in batched mode.")
+    parser.add_argument("--sequential", action="store_true",
+                        help="Classify one article at a time through the zero-shot pipeline.")
+    parser.add_argument("--backend", choices=BACKENDS, default="torch",
+                        help="Inference runtime for batched mode (int8/ONNX trade a little accuracy for speed).")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Classifier processes for batched mode, each loading its own copy of the model.")
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="Torch threads per worker process (default: CPU count / workers).")
+    parser.add_argument("--parity", type=int, metavar="N", default=0,
+                        help="Instead of classifying, report per-label score drift of --backend against "
+                             "the reference pipeline on the first N stored articles.")
+    parser.add_argument("--tiered", action="store_true",
+                        help="Score with a sentence-embedding model first and only send uncertain articles to NLI.")
+    parser.add_argument("--embedding-model", default=EMBEDDING_MODEL,
+                        help="Sentence-embedding model for the fast tier.")
+    parser.add_argument("--band", type=float, nargs=2, metavar=("LOW", "HIGH"), default=list(UNCERTAINTY_BAND),
+                        help="Fast-tier scores strictly inside this band escalate an article to NLI.")
+    parser.add_argument("--tier-report", type=int, metavar="N", default=0,
+                        help="Instead of classifying, compare the fast tier with NLI on the first N stored articles.")
+    parser.add_argument("--service-url", default=classifier_service.SERVICE_URL,
+                        help="Classifier service to use when it is running (see classifier_service.py).")
+    parser.add_argument("--no-service", action="store_true",
+                        help="Always load the model in this process, even if a classifier service is running.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Do not read or write the on-disk classification score and token caches.")
+    add_premise_args(parser)
+    parser.add_argument("--profile", action="store_true",
+                        help=f"Profile the run with cProfile (written to {metrics.REPORT_DIR}/classify.prof).")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+    with metrics.run_report("classify", profile=args.profile):
+        run(args)
+
+def run(args):
     logging.info("Starting classification process.")
-    articles = load_articles(JSON_FILE)
+    articles = load_articles(STORE_FILE)
     if not articles:
         logging.error("No articles loaded. Exiting classification process.")
         return
 
-    logging.info("Loading Hugging Face zero-shot classification pipeline.")
-    classifier = pipeline("zero-shot-classification", model="facebook/bart-large-mnli", multi_label=True)
+    if args.parity:
+        from transformers import pipeline
+        reference = pipeline("zero-shot-classification", model=args.model, multi_label=True)
+        parity_report(articles, load_scorer(args.model, args.backend), reference, args.parity)
+        return
+
+    def nli_classifier():
+        return load_classifier(args.model, args.backend, args.workers, args.threads_per_worker,
+                               args.service_url, not args.no_service)
+
+    if args.tier_report:
+        classifier = nli_classifier()
+        tier_report(articles, EmbeddingScorer(args.embedding_model), classifier, tuple(args.band), args.tier_report)
+        if hasattr(classifier, "close"):
+            classifier.close()
+        return
+
+    if args.sequential:
+        pending = [article for article in articles if "classifications" not in article]
+    else:
+        input_spec = PremiseBuilder.spec_for(args.token_budget, args.windows, args.aggregate)
+        config = classifier_config(backend_model_key(args.model, args.backend), input_spec=input_spec)
+        # Scores from either tier are up to date in both modes: otherwise the hourly
+        # default run would send every article a --tiered run settled back through NLI
+        fast_config = tier_config(args.embedding_model)
+        pending = [article for article in articles
+                   if not is_current(article, config) and not is_current(article, fast_config)]
+    if not pending:
+        logging.info("All %d articles are already classified.", len(articles))
+        return
+
+    cache = None
+    classifier = None
+    builder = None
 
-    articles = classify_articles(articles, classifier)
-    save_articles(articles, JSON_FILE)
+    def premise_builder(scorer):
+        nonlocal builder
+        builder = load_builder(scorer, args.token_budget, args.windows, args.aggregate, not args.no_cache)
+        return builder
+
+    if args.sequential:
+        from transformers import pipeline
+        logging.info("Loading Hugging Face zero-shot classification pipeline.")
+        classifier = pipeline("zero-shot-classification", model=args.model, multi_label=True)
+    else:
+        if not args.no_cache:
+            cache = ClassificationCache()
+        if not args.tiered:
+            classifier = nli_classifier()
+            premise_builder(classifier)
+        # Seeding needs the premise spec, known up front unless a tiered run loads NLI lazily
+        if cache is not None and cache.is_new and (builder is not None or not args.token_budget):
+            seed_cache(cache, articles, config, builder=builder)
+
+    if args.tiered and not args.sequential:
+        def load_nli():
+            nonlocal classifier
+            classifier = nli_classifier()
+            return classifier
+
+        pending = classify_articles_tiered(pending, EmbeddingScorer(args.embedding_model), load_nli,
+                                           tuple(args.band), args.batch_size, cache, premise_builder)
+    else:
+        by_url = {article["url"]: article for article in articles}
+        pending = classify_articles(pending, classifier, args.batch_size, cache, builder, by_url.get)
+    save_classifications(pending, STORE_FILE)
+    if cache is not None:
+        cache.close()
+    if builder is not None and builder.cache is not None:
+        builder.cache.close()
+    if classifier is not None and hasattr(classifier, "close"):
+        classifier.close()
     logging.info("Classification process completed.")
 
 if __name__ == "__main__":
@@ -1,55 +1,128 @@
 import streamlit as st
 import json
 import os
+import time
+import functools
+import hashlib
+import threading
+import numpy as np
 from datetime import datetime
-from bs4 import BeautifulSoup
 from streamlit_autorefresh import st_autorefresh
 import requests
+import metrics
+import segments
+from parsing import html_to_text
+from dashboard_index import ArticleIndex, prepare_articles
+from search import MAX_CANDIDATES, MAX_RESULTS, SEARCH_FILE, SearchIndex
 
+# Whole-script render time, reported with the load and search timings below
+render_started = time.perf_counter()
+
+# Memoized: only articles on the current page are cleaned, each once per process
+@functools.lru_cache(maxsize=2048)
 def clean_text(html_content):
     # Parse HTML, extract text, and escape dollar signs.
-    text = BeautifulSoup(html_content, "html.parser").get_text(separator=" ", strip=True)
+    text = html_to_text(html_content)
     return text.replace("$", "\$")
 
 # Auto-refresh the app every 5 minutes (300,000 ms)
 st_autorefresh(interval=300000, limit=None, key="autorefresh_key")
 
-def load_articles(json_file="articles.json"):
-    """Load articles from JSON and add a datetime object for sorting."""
-    if os.path.exists(json_file):
-        with open(json_file, 'r') as f:
-            articles = json.load(f)
-        # Convert ISO publication dates to datetime objects for sorting.
-        for article in articles:
-            if article.get("pub_date"):
-                try:
-                    article["pub_date_dt"] = datetime.fromisoformat(article["pub_date"])
-                except Exception as e:
-                    article["pub_date_dt"] = None
-            else:
-                article["pub_date_dt"] = None
-        return articles
-    else:
-        return []
-
-def load_articles_from_github(url="https://raw.githubusercontent.com/trd-digital/BlurbArticleAggregator/refs/heads/main/articles.json"):
-    token = os.environ.get("GH_TOKEN")  # Ensure you set this environment variable in production.
-    headers = {"Authorization": f"token {token}"} if token else {}
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        articles = response.json()
-        # Process each article to convert dates, etc.
-        for article in articles:
-            if article.get("pub_date"):
-                try:
-                    article["pub_date_dt"] = datetime.fromisoformat(article["pub_date"])
-                except Exception as e:
-                    article["pub_date_dt"] = None
-            else:
-                article["pub_date_dt"] = None
-        return articles
-    else:
-        return []
+# Articles rendered per page of the feed
+PAGE_SIZE = 25
+PAGE_SIZES = [10, 25, 50, 100]
+
+# Seconds between checks of the remote corpus for changes; "Refresh Data" checks at once
+REMOTE_CHECK_INTERVAL = 60
+
+class CorpusCache:
+    """The prepared article set and its indexes, kept in memory across reruns and sessions.
+
+    `version` is whatever identifies the loaded corpus: the local file's
+    (mtime, size), or the hash of the remote segment manifest. Callers must not mutate the articles.
+    The search index is synced with each new version, which only re-indexes
+    articles whose text changed.
+    """
+
+    def __init__(self, search_path=":memory:"):
+        self.lock = threading.Lock()
+        self.version = None
+        # Validator of the remote manifest, sent with If-None-Match
+        self.etag = None
+        self.index = ArticleIndex([])
+        self.search = SearchIndex(search_path)
+        self.checked_at = 0.0
+        # Search document id of each index row (-1: not indexed), as of search version _doc_ids_version
+        self._doc_ids = np.empty(0, dtype=np.int64)
+        self._doc_ids_version = None
+
+    def update(self, articles, version):
+        with metrics.timer("corpus_build_seconds"):
+            articles = prepare_articles(articles)
+            self.search.sync(articles)
+            self.index = ArticleIndex(articles)
+        self.version = version
+
+    def doc_ids(self, rows):
+        """Search document ids of index rows, looked up again only when the search index changed."""
+        version = self.search.version
+        if self._doc_ids_version != version or len(self._doc_ids) != len(self.index):
+            ids = self.search.doc_ids(article.get("url") for article in self.index.articles)
+            self._doc_ids = np.array([-1 if doc_id is None else doc_id for doc_id in ids], dtype=np.int64)
+            self._doc_ids_version = version
+        return self._doc_ids[rows]
+
+@st.cache_resource
+def corpus_cache(source, search_path=":memory:"):
+    return CorpusCache(search_path)
+
+def load_corpus(json_file="articles.json"):
+    """Corpus of the articles in a JSON file, re-read only when the file changes."""
+    # Shares the search index the scrapers keep up to date
+    cache = corpus_cache(os.path.abspath(json_file), SEARCH_FILE)
+    if not os.path.exists(json_file):
+        return cache
+    stat = os.stat(json_file)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with cache.lock:
+        if cache.version != version:
+            with open(json_file, 'r') as f:
+                cache.update(json.load(f), version)
+        return cache
+
+def load_corpus_from_github(url="https://raw.githubusercontent.com/trd-digital/BlurbArticleAggregator/refs/heads/main/corpus/",
+                              force=False):
+    """Corpus of the segments published on GitHub (see segments.py).
+
+    Only the manifest is requested on each check, conditionally on its ETag;
+    segments whose hash changed are downloaded and the rest come from the
+    local segment cache.
+    """
+    cache = corpus_cache(url)
+    with cache.lock:
+        if not force and time.time() - cache.checked_at < REMOTE_CHECK_INTERVAL:
+            return cache
+        token = os.environ.get("GH_TOKEN")  # Ensure you set this environment variable in production.
+        headers = {"Authorization": f"token {token}"} if token else {}
+        conditional = dict(headers)
+        if cache.etag:
+            conditional["If-None-Match"] = cache.etag
+        try:
+            response = requests.get(url + segments.MANIFEST_FILE, headers=conditional, timeout=30)
+            cache.checked_at = time.time()
+            if response.status_code != 200:
+                return cache
+            metrics.inc("remote_bytes_total", len(response.content), file="manifest")
+            # The same segment hashes mean the same corpus, whatever the ETag says
+            version = hashlib.sha256(response.content).hexdigest()
+            if version != cache.version:
+                cache.update(segments.load_remote(url, response.json(), headers), version)
+            # Only once the segments are in, so a failed download is retried on the next check
+            cache.etag = response.headers.get("ETag")
+        except (requests.RequestException, ValueError, KeyError, TypeError):
+            # Unreachable, or a malformed manifest or segment: keep showing the last corpus we have
+            pass
+        return cache
 
 
 # Try to get the environment variable from st.secrets first, then fallback to os.environ.
@@ -65,70 +138,109 @@ else:
     token = os.environ.get("GH_TOKEN")
 
 
+def request_refresh():
+    # Runs before the rerun the button triggers, so the load below sees it
+    st.session_state["force_refresh"] = True
+
 if environment == "local":
-    articles = load_articles()
+    with metrics.timer("load_seconds", source="local"):
+        corpus = load_corpus()
     st.write("Loading locally...")
 else:
-    articles = load_articles_from_github()
+    with metrics.timer("load_seconds", source="github"):
+        corpus = load_corpus_from_github(force=st.session_state.pop("force_refresh", False))
     st.write("Loading from GitHub...")
+index = corpus.index
 
 st.title("Real Estate News Dashboard")
-st.write(f"Showing **{len(articles)}** articles.")
+st.write(f"Showing **{len(index)}** articles.")
 
 # Manual refresh button to force a fresh load.
-if st.button("Refresh Data"):
-    st.rerun()
+st.button("Refresh Data", on_click=request_refresh)
+
+# Full-text search over headlines, subheads and article text.
+query = st.text_input("Search articles", placeholder="Address, developer, neighborhood...").strip()
 
 # Sidebar: Filtering and sorting options.
 st.sidebar.header("Filters & Sorting Options")
 
-# Filter by Outlet: Get unique outlets from the JSON.
-outlets = sorted(list({article.get("Outlet", "Unknown") for article in articles}))
-selected_outlet = st.sidebar.selectbox("Filter by Outlet", ["All"] + outlets)
+# Filter by Outlet.
+selected_outlet = st.sidebar.selectbox("Filter by Outlet", ["All"] + index.outlets)
+
+# Filter by publication date range.
+date_range = None
+bounds = index.date_bounds()
+if bounds:
+    first_day, last_day = (datetime.fromtimestamp(ts).date() for ts in bounds)
+    picked = st.sidebar.date_input("Published between", value=(first_day, last_day),
+                                   min_value=first_day, max_value=last_day)
+    # The picker returns a single date while the range is being chosen
+    if isinstance(picked, (tuple, list)) and len(picked) == 2 and tuple(picked) != (first_day, last_day):
+        date_range = (datetime.combine(picked[0], datetime.min.time()).timestamp(),
+                      datetime.combine(picked[1], datetime.max.time()).timestamp())
+
+# Filter by a minimum classification score.
+min_scores = {}
+if index.labels:
+    threshold_category = st.sidebar.selectbox("Minimum Score In", ["Any"] + index.labels)
+    if threshold_category != "Any":
+        min_scores[threshold_category] = st.sidebar.slider("Minimum Score", 0.0, 1.0, 0.7, 0.05)
+
+# Near-duplicate stories (wire copies, republished variants) shown once.
+collapse_duplicates = st.sidebar.checkbox("Collapse duplicate stories", value=True)
 
 # Sorting: Option dropdown and order.
-sort_option = st.sidebar.selectbox("Sort Articles By", ["Publication Date", "Outlet", "Classification Score"])
+sort_options = ["Publication Date", "Outlet", "Classification Score"]
+if query:
+    sort_options.insert(0, "Relevance")
+sort_option = st.sidebar.selectbox("Sort Articles By", sort_options)
 sort_order = st.sidebar.radio("Sort Order", ["Descending", "Ascending"])
 
 # If sorting by classification score, choose a category.
 classification_category = None
 if sort_option == "Classification Score":
-    classification_keys = set()
-    for article in articles:
-        for key in article.get("classifications", {}).keys():
-            classification_keys.add(key)
-    classification_keys = sorted(list(classification_keys))
-    if classification_keys:
-        classification_category = st.sidebar.selectbox("Select Classification Category", classification_keys)
+    if index.labels:
+        classification_category = st.sidebar.selectbox("Select Classification Category", index.labels)
     else:
         st.sidebar.info("No classification data available.")
 
-# Apply outlet filtering.
-if selected_outlet != "All":
-    articles = [article for article in articles if article.get("Outlet", "Unknown") == selected_outlet]
-
-# Sorting logic.
-if sort_option == "Publication Date":
-    articles = sorted(
-        articles,
-        key=lambda a: a.get("pub_date_dt") or datetime.min,
-        reverse=(sort_order == "Descending")
-    )
-elif sort_option == "Outlet":
-    articles = sorted(
-        articles,
-        key=lambda a: a.get("Outlet", ""),
-        reverse=(sort_order == "Descending")
-    )
-elif sort_option == "Classification Score" and classification_category:
-    articles = sorted(
-        articles,
-        key=lambda a: a.get("classifications", {}).get(classification_category, 0),
-        reverse=(sort_order == "Descending")
-    )
-
-# Display each article.
-for article in articles:
+# Apply the filters to row numbers of the index.
+rows = index.select(
+    outlet=None if selected_outlet == "All" else selected_outlet,
+    date_range=date_range,
+    min_scores=min_scores,
+    hide_duplicates=collapse_duplicates,
+)
+truncated_search = False
+if query:
+    # Search hits in rank order among the filtered rows; the filters go into the query, ahead of its limits
+    with metrics.timer("search_seconds"):
+        filtered_ids = None if len(rows) == len(index) else corpus.doc_ids(rows).tolist()
+        hits = corpus.search.search(query, ids=filtered_ids)
+    truncated_search = hits.truncated
+    rows = index.rows_for(hits)
+
+# Pagination: only the current page of articles is rendered.
+page_size = st.sidebar.selectbox("Articles per page", PAGE_SIZES, index=PAGE_SIZES.index(PAGE_SIZE))
+num_pages = max(1, -(-len(rows) // page_size))
+# Filters can shrink the list below the page the reader was on
+if st.session_state.get("page", 1) > num_pages:
+    st.session_state["page"] = num_pages
+page = st.sidebar.number_input(f"Page (of {num_pages})", min_value=1, max_value=num_pages, step=1, key="page")
+start = (page - 1) * page_size
+# Only rows up to the end of this page need to be put in order
+ordered = index.order(rows, sort_option, sort_order == "Descending", classification_category,
+                      limit=start + page_size)
+page_rows = ordered[start:]
+page_articles = [index.articles[row] for row in page_rows]
+if len(rows):
+    st.caption(f"Articles {start + 1}-{start + len(page_articles)} of {len(rows)}")
+if truncated_search:
+    st.caption(f"More articles match: results are the best {MAX_RESULTS} among the {MAX_CANDIDATES:,} most recently "
+               "published matches. Narrow the search or the filters to see the rest.")
+
+# Display each article on the page.
+for row, article in zip(page_rows, page_articles):
     # Headline in bold.
     st.markdown(f"**{article.get('hed', 'No Title')}**")
     
@@ -147,6 +259,12 @@ for article in articles:
     if "classifications" in article:
         class_text = ", ".join([f"{label}: {score:.2f}" for label, score in article["classifications"].items()])
         st.caption(f"Classifications (AI-generated): {class_text}")
+
+    # Collapsed near-duplicates are linked from their canonical article.
+    if collapse_duplicates and row in index.copies:
+        also = ", ".join(f"[{index.articles[copy].get('Outlet', 'Unknown')}]({index.articles[copy]['url']})"
+                         for copy in index.copies[row])
+        st.caption(f"Also published by: {also}")
     
     # "Read More" expander reveals the full article text.
     with st.expander("Read More"):
@@ -155,3 +273,6 @@ for article in articles:
         st.write(full_text)
     
     st.markdown("---")
+
+metrics.observe("render_seconds", time.perf_counter() - render_started)
+metrics.write_reports("dashboard", metrics.PROCESS_STARTED)
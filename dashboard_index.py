@@ -0,0 +1,135 @@
+from datetime import datetime
+
+import numpy as np
+
+# Columnar index over the dashboard's articles.
+#
+# Built once per corpus version (see dashboard.CorpusCache), it holds NumPy
+# columns of outlet codes, publication timestamps and an articles x labels
+# score matrix, so filtering and sorting on a rerun are vectorized operations
+# over row numbers instead of Python loops over dicts. Row numbers index into
+# `articles`, which is never reordered.
+
+# Sort key of articles without a publication date, like datetime.min
+MISSING_DATE = -np.inf
+
+
+def prepare_articles(articles):
+    # Convert ISO publication dates to datetime objects for sorting.
+    for article in articles:
+        if article.get("pub_date"):
+            try:
+                article["pub_date_dt"] = datetime.fromisoformat(article["pub_date"])
+            except Exception as e:
+                article["pub_date_dt"] = None
+        else:
+            article["pub_date_dt"] = None
+    return articles
+
+
+class ArticleIndex:
+    def __init__(self, articles):
+        self.articles = articles
+        self.row_of = {article.get("url"): row for row, article in enumerate(articles)}
+        outlets = [article.get("Outlet", "Unknown") for article in articles]
+        self.outlets = sorted(set(outlets))
+        # Codes are ranks of the sorted names, so sorting codes sorts by outlet name
+        codes = {outlet: code for code, outlet in enumerate(self.outlets)}
+        self.outlet_codes = np.array([codes[outlet] for outlet in outlets], dtype=np.int32)
+        self.pub_ts = np.array([article["pub_date_dt"].timestamp() if article.get("pub_date_dt") else MISSING_DATE
+                                for article in articles], dtype=np.float64)
+
+        # Near-duplicates (see dedup.py) whose canonical article is in the corpus
+        self.is_duplicate = np.array([article.get("duplicate_of") in self.row_of for article in articles], dtype=bool)
+        # Row of each article's canonical article, -1 for articles that are not copies
+        self.canonical = np.array([self.row_of.get(article.get("duplicate_of"), -1) for article in articles],
+                                  dtype=np.intp)
+        self.copies = {}
+        for row in np.flatnonzero(self.is_duplicate):
+            self.copies.setdefault(self.row_of[articles[row]["duplicate_of"]], []).append(int(row))
+
+        self.labels = sorted({label for article in articles for label in article.get("classifications", {})})
+        columns = {label: column for column, label in enumerate(self.labels)}
+        # NaN where an article has no score for a label
+        self.scores = np.full((len(articles), len(self.labels)), np.nan, dtype=np.float32)
+        for row, article in enumerate(articles):
+            for label, score in article.get("classifications", {}).items():
+                self.scores[row, columns[label]] = score
+
+    def __len__(self):
+        return len(self.articles)
+
+    def rows_for(self, urls):
+        """Row numbers of these URLs, in the given order; unknown URLs are skipped."""
+        return np.array([self.row_of[url] for url in urls if url in self.row_of], dtype=np.intp)
+
+    def date_bounds(self):
+        """(earliest, latest) publication timestamps, or None if no article has a date."""
+        dated = self.pub_ts[self.pub_ts != MISSING_DATE]
+        return (dated.min(), dated.max()) if dated.size else None
+
+    def select(self, outlet=None, date_range=None, min_scores=None, hide_duplicates=False):
+        """Row numbers, in corpus order, of the articles passing every filter.
+
+        date_range is (start, end) in timestamps, inclusive; undated articles
+        are dropped by it. min_scores maps labels to thresholds; an article
+        without a score for the label is dropped. hide_duplicates leaves out
+        near-duplicates whose canonical article is shown, as they are listed
+        under it; a copy whose canonical is filtered out stays.
+        """
+        mask = np.ones(len(self.articles), dtype=bool)
+        if outlet is not None:
+            if outlet not in self.outlets:
+                return np.empty(0, dtype=np.intp)
+            mask &= self.outlet_codes == self.outlets.index(outlet)
+        if date_range is not None:
+            start, end = date_range
+            mask &= (self.pub_ts >= start) & (self.pub_ts <= end)
+        for label, threshold in (min_scores or {}).items():
+            if label not in self.labels:
+                return np.empty(0, dtype=np.intp)
+            # NaN compares False, so unscored articles drop out
+            mask &= self.scores[:, self.labels.index(label)] >= threshold
+        if hide_duplicates:
+            # A copy is shown only if its canonical is not, which for a copy of
+            # a copy is settled once that canonical is; chains are walked down
+            undecided = np.flatnonzero(self.is_duplicate & mask)
+            while undecided.size:
+                canonical = self.canonical[undecided]
+                settled = ~np.isin(canonical, undecided)
+                if not settled.any():
+                    break  # A cycle of copies: leave them all in
+                mask[undecided[settled]] = ~mask[canonical[settled]]
+                undecided = undecided[~settled]
+        return np.flatnonzero(mask)
+
+    def sort_key(self, by, label=None):
+        if by == "Publication Date":
+            return self.pub_ts
+        if by == "Outlet":
+            return self.outlet_codes
+        if by == "Classification Score" and label in self.labels:
+            # Missing scores sort as 0, as they always have
+            return np.nan_to_num(self.scores[:, self.labels.index(label)], nan=0.0)
+        return None
+
+    def order(self, rows, by, descending=True, label=None, limit=None):
+        """Sort row numbers by a column; ties keep corpus order, like sorted(reverse=...).
+
+        With `limit`, only the first `limit` rows of the result are computed:
+        rows beyond the limit-th key are discarded before sorting.
+        """
+        key = self.sort_key(by, label)
+        # Unknown sorts (e.g. search relevance) keep the order rows came in
+        if key is None:
+            return rows[:limit]
+        keys = key[rows].astype(np.float64)
+        if descending:
+            keys = -keys
+        if limit is not None and limit < len(rows):
+            if limit <= 0:
+                return rows[:0]
+            cutoff = np.partition(keys, limit - 1)[limit - 1]
+            keep = keys <= cutoff
+            rows, keys = rows[keep], keys[keep]
+        return rows[np.argsort(keys, kind="stable")][:limit]
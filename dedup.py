@@ -0,0 +1,198 @@
+import os
+import re
+import json
+import base64
+import hashlib
+import logging
+import argparse
+
+import numpy as np
+
+import store
+
+# Near-duplicate detection across outlets with MinHash and LSH.
+#
+# Wire stories run on both the Globe and Boston.com, and NY Post republishes
+# variants. Each article's content is reduced to a MinHash signature over
+# 3-word shingles; signatures are split into LSH bands, and articles sharing a
+# band are compared. An article whose estimated Jaccard similarity with an
+# earlier one is at least THRESHOLD gets "duplicate_of" set to the URL of that
+# cluster's first article (the canonical one). With 3-word shingles, replacing
+# 5% of a story's words leaves a similarity of about 0.72 and replacing 8%
+# about 0.6, so lightly edited copies are caught; distinct stories in the
+# store stay below 0.2. classify.py copies the
+# canonical article's scores instead of running NLI again, and the dashboard
+# can collapse duplicates under it.
+#
+# Signatures are appended to SIGNATURES_FILE and rebuilt from the store when it
+# is missing, like seen_urls.txt.
+#
+#   python dedup.py rebuild    # re-cluster the whole store
+
+# Named for the shingle size: signatures of other sizes are not comparable
+SIGNATURES_FILE = os.path.join(".cache", "dedup", "signatures-3w.jsonl")
+NUM_PERM = 128
+# 32 bands of 4 rows: pairs at the threshold are compared 99% of the time,
+# pairs at 0.2 about 5% of the time
+BANDS = 32
+THRESHOLD = 0.6
+SHINGLE_WORDS = 3
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+# Fixed seed: signatures must be comparable across runs
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, (1 << 61) - 1, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, (1 << 61) - 1, size=NUM_PERM, dtype=np.uint64)
+
+WORD = re.compile(r"\w+")
+
+
+def shingles(text):
+    words = WORD.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[k:k + SHINGLE_WORDS]) for k in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def signature(text):
+    """MinHash signature of the text's shingles, or None for empty text."""
+    found = shingles(text)
+    if not found:
+        return None
+    hashes = np.array([int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little")
+                       for s in found], dtype=np.uint64)
+    # Universal hashing (a*x + b mod p) for every permutation at once; wraparound is fine
+    with np.errstate(over="ignore"):
+        permuted = ((np.outer(hashes, _A) + _B) % _MERSENNE_PRIME) & _MAX_HASH
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.mean(a == b))
+
+
+def _encode(sig):
+    return base64.b64encode(sig.tobytes()).decode("ascii")
+
+
+def _decode(text):
+    return np.frombuffer(base64.b64decode(text), dtype=np.uint32)
+
+
+class DuplicateIndex:
+    def __init__(self, path=SIGNATURES_FILE, store_file=store.STORE_FILE, threshold=THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self.signatures = {}
+        self.canonical = {}
+        self.buckets = {}
+        self._unsaved = []
+        if not os.path.exists(path):
+            rebuild(path, store_file)
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                # A torn last line is simply left out
+                if line.endswith("\n"):
+                    row = json.loads(line)
+                    self._add(row["url"], _decode(row["sig"]), row.get("duplicate_of"))
+        logging.info("Loaded %d content signatures from %s.", len(self.signatures), path)
+
+    def _bands(self, sig):
+        rows = NUM_PERM // BANDS
+        return [(band, sig[band * rows:(band + 1) * rows].tobytes()) for band in range(BANDS)]
+
+    def _add(self, url, sig, duplicate_of):
+        self.signatures[url] = sig
+        self.canonical[url] = duplicate_of or url
+        for key in self._bands(sig):
+            self.buckets.setdefault(key, []).append(url)
+
+    def find(self, sig, url=None):
+        """Canonical URL of the most similar known article above the threshold, or None."""
+        candidates = {other for key in self._bands(sig) for other in self.buckets.get(key, ()) if other != url}
+        best, best_score = None, self.threshold
+        for other in candidates:
+            score = similarity(sig, self.signatures[other])
+            if score >= best_score:
+                best, best_score = other, score
+        return self.canonical[best] if best else None
+
+    def assign(self, article):
+        """Set article["duplicate_of"] if it repeats a known article; returns that URL or None."""
+        url = article.get("url")
+        if not url:
+            return None
+        if url in self.canonical:
+            duplicate_of = self.canonical[url] if self.canonical[url] != url else None
+            if duplicate_of:
+                article["duplicate_of"] = duplicate_of
+            return duplicate_of
+        sig = signature(article.get("content", ""))
+        if sig is None:
+            return None
+        duplicate_of = self.find(sig, url)
+        if duplicate_of:
+            article["duplicate_of"] = duplicate_of
+            logging.info("Article %s duplicates %s.", url, duplicate_of)
+        self._add(url, sig, duplicate_of)
+        self._unsaved.append({"url": url, "sig": _encode(sig), "duplicate_of": duplicate_of})
+        return duplicate_of
+
+    def save(self):
+        if not self._unsaved:
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(row) + "\n" for row in self._unsaved))
+            f.flush()
+            os.fsync(f.fileno())
+        self._unsaved = []
+
+
+def rebuild(path=SIGNATURES_FILE, store_file=store.STORE_FILE):
+    """Recreate the signatures file from the store, keeping recorded clusters."""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    store.bootstrap(store_file)
+    rows = []
+    for record in store.merge_records(store.read_records(store_file)):
+        sig = signature(record.get("content", ""))
+        if sig is not None:
+            rows.append({"url": record["url"], "sig": _encode(sig), "duplicate_of": record.get("duplicate_of")})
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write("".join(json.dumps(row) + "\n" for row in rows))
+    os.replace(path + ".tmp", path)
+    logging.info("Rebuilt %s with %d signatures.", path, len(rows))
+
+
+def recluster(store_file=store.STORE_FILE, path=SIGNATURES_FILE):
+    """Cluster every stored article from scratch, oldest first, and record the result."""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8"):
+        pass
+    index = DuplicateIndex(path, store_file)
+    articles = sorted(store.load_articles(store_file), key=lambda article: article.get("pub_date") or "")
+    updates = []
+    for article in articles:
+        previous = article.pop("duplicate_of", None)
+        duplicate_of = index.assign(article)
+        if duplicate_of != previous:
+            updates.append({"url": article["url"], "duplicate_of": duplicate_of})
+    index.save()
+    store.upsert(updates, store_file)
+    clustered = sum(1 for url, canonical in index.canonical.items() if canonical != url)
+    logging.info("Reclustered %d articles: %d are duplicates.", len(articles), clustered)
+    print(f"{clustered} of {len(articles)} articles are near-duplicates; {len(updates)} records updated.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Near-duplicate detection across outlets.")
+    parser.add_argument("command", choices=["rebuild"], help="rebuild: re-cluster every stored article.")
+    parser.parse_args()
+    recluster()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import logging
+
+# Fast first tier for tiered classification.
+#
+# A small sentence-embedding model scores each article by cosine similarity
+# against embeddings of the candidate labels, which are computed once per
+# process. Similarities are mapped linearly from SIMILARITY_RANGE onto [0, 1]
+# so they can stand in for NLI scores. Articles with any label score inside
+# the uncertainty band are escalated to the full NLI model (see
+# classify.classify_articles_tiered). Run `classify.py --tier-report N` to see
+# how often that happens and how far the fast scores are from NLI.
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# Cosine similarities mapped to scores of 0 and 1
+SIMILARITY_RANGE = (0.05, 0.55)
+# Articles with any label score strictly inside this band go to NLI
+UNCERTAINTY_BAND = (0.3, 0.7)
+MAX_LENGTH = 256
+BATCH_SIZE = 32
+
+
+class EmbeddingScorer:
+    def __init__(self, model_id=EMBEDDING_MODEL, similarity_range=SIMILARITY_RANGE, max_length=MAX_LENGTH):
+        from transformers import AutoTokenizer, AutoModel
+
+        logging.info("Loading embedding model %s.", model_id)
+        self.model_id = model_id
+        self.similarity_range = similarity_range
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+        self.model = AutoModel.from_pretrained(model_id).eval()
+        self._label_embeddings = {}
+
+    def embed(self, texts, batch_size=BATCH_SIZE):
+        """Mean-pooled, L2-normalized embeddings, one row per text."""
+        import torch
+
+        rows = []
+        for start in range(0, len(texts), batch_size):
+            inputs = self.tokenizer(texts[start:start + batch_size], padding=True, truncation=True,
+                                    max_length=self.max_length, return_tensors="pt")
+            with torch.inference_mode():
+                hidden = self.model(**inputs).last_hidden_state
+            mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+            rows.append(torch.nn.functional.normalize(pooled, dim=-1))
+        return torch.cat(rows) if rows else torch.empty(0)
+
+    def label_embeddings(self, labels):
+        import torch
+
+        missing = [label for label in labels if label not in self._label_embeddings]
+        if missing:
+            for label, row in zip(missing, self.embed(missing)):
+                self._label_embeddings[label] = row
+        return torch.stack([self._label_embeddings[label] for label in labels])
+
+    def score(self, texts, labels, batch_size=BATCH_SIZE):
+        """Calibrated similarity scores; returns one {label: score} dict per text."""
+        if not texts:
+            return []
+        similarities = self.embed(texts, batch_size) @ self.label_embeddings(labels).T
+        low, high = self.similarity_range
+        scores = ((similarities - low) / (high - low)).clamp(0.0, 1.0).tolist()
+        return [dict(sorted(zip(labels, row), key=lambda item: item[1], reverse=True)) for row in scores]
+
+
+def is_uncertain(scores, band=UNCERTAINTY_BAND):
+    low, high = band
+    return any(low < score < high for score in scores.values())
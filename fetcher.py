@@ -0,0 +1,240 @@
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+# Defaults for the shared fetch engine
+MAX_WORKERS = 16
+PER_HOST_LIMIT = 4
+# Adaptive per-host concurrency grows back up to this after backing off
+PER_HOST_MAX = 8
+USER_AGENT = "Mozilla/5.0 (compatible; ArticleAggregator/1.0)"
+# (connect, read) timeouts in seconds; a stalled host can no longer hang a run
+TIMEOUT = (5, 30)
+# Retries after the first attempt, with jittered exponential backoff
+RETRIES = 3
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Consecutive failed URLs after which a host is skipped for BREAKER_COOLDOWN seconds
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 300.0
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of requesting a host whose circuit breaker is open."""
+
+
+class HostLimiter:
+    """Adaptive concurrency limit for one host (additive increase, multiplicative decrease).
+
+    Each success raises the limit by 1/limit, so by about one request per
+    round trip; a 429, 5xx or connection error halves it.
+    """
+
+    def __init__(self, initial=PER_HOST_LIMIT, maximum=PER_HOST_MAX):
+        self.limit = float(initial)
+        self.maximum = maximum
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def __enter__(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def success(self):
+        with self._cond:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def backoff(self):
+        with self._cond:
+            self.limit = max(1.0, self.limit / 2)
+
+
+class CircuitBreaker:
+    """Stops requests to a host after repeated failures, then lets one through to probe it."""
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def check(self, url):
+        """Raise CircuitOpenError if url's host is being skipped; return True if this request probes it."""
+        with self._lock:
+            if self.opened_at is None:
+                return False
+            if time.monotonic() - self.opened_at < self.cooldown:
+                raise CircuitOpenError(f"Circuit open for {urlsplit(url).netloc}; skipping {url}")
+            # Half-open: this request probes the host; the rest are skipped for another cooldown
+            # unless it succeeds
+            self.opened_at = time.monotonic()
+            return True
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def failure(self, url, probe=False):
+        with self._lock:
+            self.failures += 1
+            if probe:
+                # The cooldown restarts from the failed probe, not from when it began
+                self.opened_at = time.monotonic()
+                logging.error("Probe of %s failed; circuit stays open.", urlsplit(url).netloc)
+            elif self.failures >= self.threshold and self.opened_at is None:
+                self.opened_at = time.monotonic()
+                logging.error("Circuit opened for %s after %d consecutive failures.",
+                              urlsplit(url).netloc, self.failures)
+
+
+def make_session(pool_size=MAX_WORKERS):
+    """Create a keep-alive session whose connection pool matches the worker count."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"User-Agent": USER_AGENT})
+    return session
+
+
+class Fetcher:
+    """Bounded thread pool that fetches pages over pooled connections.
+
+    Requests in flight against any single host are capped by an adaptive
+    limit that starts at `per_host`, so several outlets can be crawled at once
+    without hammering one of them. Every request has connect/read timeouts;
+    timeouts, connection errors, 429s and 5xx responses are retried with
+    jittered exponential backoff, and a host that keeps failing is skipped by
+    its circuit breaker.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, per_host=PER_HOST_LIMIT, session=None, cache=None,
+                 timeout=TIMEOUT, retries=RETRIES, per_host_max=None):
+        self.max_workers = max_workers
+        self.per_host = per_host
+        # Ceiling of the adaptive per-host limit
+        self.per_host_max = per_host_max or max(per_host, PER_HOST_MAX)
+        self.session = session or make_session(max_workers)
+        # Optional httpcache.ResponseCache used for conditional requests
+        self.cache = cache
+        self.timeout = timeout
+        self.retries = retries
+        self._limiters = {}
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def _host_state(self, url):
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            if host not in self._limiters:
+                self._limiters[host] = HostLimiter(self.per_host, self.per_host_max)
+                self._breakers[host] = CircuitBreaker()
+            return self._limiters[host], self._breakers[host]
+
+    def _delay(self, attempt, response):
+        # Honour a numeric Retry-After, otherwise back off exponentially with full jitter
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), BACKOFF_MAX)
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    def get(self, url, conditional=False):
+        """Fetch a single URL, respecting the per-host limit and retrying transient failures.
+
+        With conditional=True and a cache configured, the cached validators are
+        sent so an unchanged page comes back as an empty 304. Raises
+        requests.RequestException (CircuitOpenError if the host is being
+        skipped) when no response was received; a response that is still a
+        429 or 5xx after the last retry is returned.
+        """
+        limiter, breaker = self._host_state(url)
+        host = urlsplit(url).netloc.lower()
+        headers = {}
+        if conditional and self.cache is not None:
+            headers = self.cache.conditional_headers(url)
+        probe = False
+        for attempt in range(self.retries + 1):
+            response, error = None, None
+            with limiter:
+                # Checked once a slot is free: the host may have failed while this request waited.
+                # A half-open probe gets the usual retries before the breaker decides.
+                if not probe:
+                    probe = breaker.check(url)
+                try:
+                    with metrics.timer("fetch_seconds", host=host):
+                        response = self.session.get(url, headers=headers, timeout=self.timeout)
+                except requests.RequestException as e:
+                    error = e
+                    metrics.inc("fetch_errors_total", host=host, error=type(e).__name__)
+            if response is not None:
+                metrics.inc("fetch_responses_total", host=host, status=response.status_code)
+                metrics.inc("fetch_bytes_total", len(response.content), host=host)
+            if response is not None and response.status_code not in RETRY_STATUSES:
+                limiter.success()
+                breaker.success()
+                return response
+
+            limiter.backoff()
+            reason = error or f"status {response.status_code}"
+            if attempt == self.retries:
+                breaker.failure(url, probe)
+                if response is not None:
+                    return response
+                raise error
+            delay = self._delay(attempt, response)
+            metrics.inc("fetch_retries_total", host=host)
+            logging.warning("Retrying %s in %.1fs (attempt %d of %d): %s",
+                            url, delay, attempt + 2, self.retries + 1, reason)
+            time.sleep(delay)
+
+    def fetch_all(self, urls, on_error=None):
+        """Fetch every URL concurrently, yielding (url, response) as each one completes.
+
+        A request that raises is yielded as (url, None) and logged; on_error,
+        if given, is called with the URL and the exception first. If the
+        caller stops early (closes the generator), requests not started yet
+        are cancelled.
+        """
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            futures = {pool.submit(self.get, url): url for url in urls}
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    yield url, future.result()
+                except requests.RequestException as e:
+                    logging.error("Request failed for %s: %s", url, e)
+                    if on_error is not None:
+                        on_error(url, e)
+                    yield url, None
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import hashlib
+import logging
+
+from urlindex import canonicalize_url
+
+# On-disk HTTP response cache for listing pages.
+#
+# Each entry is keyed by the canonical URL and keeps the body next to its
+# ETag/Last-Modified validators. The fetcher sends them back as
+# If-None-Match/If-Modified-Since; a 304 means the page has not changed and the
+# scraper can skip parsing it. Set SCRAPE_HTTP_CACHE=0 to disable the cache.
+
+CACHE_DIR = os.path.join(".cache", "http")
+MAX_BYTES = 50 * 1024 * 1024
+
+
+def cache_enabled():
+    return os.environ.get("SCRAPE_HTTP_CACHE", "1") not in ("0", "false", "no", "off")
+
+
+def _remove(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class ResponseCache:
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, url):
+        key = hashlib.sha256(canonicalize_url(url).encode("utf-8")).hexdigest()
+        base = os.path.join(self.cache_dir, key)
+        return base + ".json", base + ".body"
+
+    def _read_meta(self, url):
+        meta_path, _ = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def conditional_headers(self, url):
+        """Validators from the cached copy of url, as request headers."""
+        meta = self._read_meta(url)
+        headers = {}
+        if meta:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def load_body(self, url):
+        _, body_path = self._paths(url)
+        try:
+            with open(body_path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def save(self, url, response):
+        """Cache a 200 response that carries validators; refresh the entry on a 304.
+
+        A 200 without validators drops the entry: its validators belong to a
+        body the server no longer serves, and revalidating against them could
+        bring that stale body back with a 304.
+        """
+        meta_path, body_path = self._paths(url)
+        if response.status_code == 304:
+            # Still fresh: only bump the entry's last-used time for eviction
+            if os.path.exists(meta_path):
+                os.utime(meta_path)
+            return
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if response.status_code != 200:
+            return
+        if not (etag or last_modified):
+            # Validators first: a body left behind without them is never revalidated
+            _remove(meta_path, body_path)
+            return
+
+        with open(body_path + ".tmp", "wb") as f:
+            f.write(response.content)
+        os.replace(body_path + ".tmp", body_path)
+        meta = {
+            "url": canonicalize_url(url),
+            "etag": etag,
+            "last_modified": last_modified,
+            "size": len(response.content),
+            "stored_at": time.time(),
+        }
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        self.evict()
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            meta_path = os.path.join(self.cache_dir, name)
+            body_path = meta_path[:-len(".json")] + ".body"
+            try:
+                size = os.path.getsize(body_path) + os.path.getsize(meta_path)
+                entries.append((os.path.getmtime(meta_path), size, meta_path, body_path))
+            except OSError:
+                continue
+            total += size
+
+        for _, size, meta_path, body_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            _remove(meta_path, body_path)
+            total -= size
+            logging.info("Evicted cached response %s.", meta_path)
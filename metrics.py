@@ -0,0 +1,192 @@
+import os
+import io
+import json
+import time
+import pstats
+import cProfile
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Per-stage timings and counters for the scrapers, classify.py and dashboard.py.
+#
+# Code records into one process-wide registry:
+#
+#   with metrics.timer("fetch_seconds", host=host): ...
+#   metrics.inc("fetch_bytes_total", len(body), host=host)
+#
+# and each entry point wraps its run in metrics.run_report(job), which writes
+# REPORT_DIR/<job>.json (run timestamps plus count, sum, mean, p50, p95 and max
+# of every histogram) and REPORT_DIR/<job>.prom in the Prometheus text format,
+# for the node_exporter textfile collector or for diffing between runs. With
+# profile=True (--profile on the command line) the run is also profiled with
+# cProfile into REPORT_DIR/<job>.prof, and the top functions are logged.
+
+REPORT_DIR = os.environ.get("METRICS_DIR", "reports")
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Observations kept per series for the quantiles in the JSON report
+MAX_SAMPLES = 10_000
+PROFILE_TOP = 30
+# Start of the reporting period for long-running processes such as the dashboard
+PROCESS_STARTED = time.time()
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.samples = []
+
+    def observe(self, value):
+        for k, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[k] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(value)
+
+    def quantile(self, q):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else 0.0,
+            "p50": round(self.quantile(0.5), 6),
+            "p95": round(self.quantile(0.95), 6),
+            "max": round(self.max, 6),
+        }
+
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def observe(name, value, **labels):
+    with _lock:
+        key = _key(name, labels)
+        if key not in _histograms:
+            _histograms[key] = Histogram()
+        _histograms[key].observe(value)
+
+
+def inc(name, amount=1, **labels):
+    with _lock:
+        key = _key(name, labels)
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+@contextmanager
+def timer(name, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def _labels_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def prometheus_text(job):
+    """The registry in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        for name in sorted({name for name, _ in _counters}):
+            lines.append(f"# TYPE {job}_{name} counter")
+            for (series, labels), value in sorted(_counters.items()):
+                if series == name:
+                    lines.append(f"{job}_{name}{_labels_text(labels)} {value}")
+        for name in sorted({name for name, _ in _histograms}):
+            lines.append(f"# TYPE {job}_{name} histogram")
+            for (series, labels), histogram in sorted(_histograms.items()):
+                if series != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{job}_{name}_bucket{_labels_text(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{job}_{name}_bucket{_labels_text(labels, [('le', '+Inf')])} {histogram.count}")
+                lines.append(f"{job}_{name}_sum{_labels_text(labels)} {histogram.sum:.6f}")
+                lines.append(f"{job}_{name}_count{_labels_text(labels)} {histogram.count}")
+    return "\n".join(lines) + "\n"
+
+
+def report(job, started, finished):
+    with _lock:
+        histograms = {}
+        for (name, labels), histogram in sorted(_histograms.items()):
+            histograms.setdefault(name, []).append({"labels": dict(labels), **histogram.summary()})
+        counters = {}
+        for (name, labels), value in sorted(_counters.items()):
+            counters.setdefault(name, []).append({"labels": dict(labels), "value": value})
+    return {
+        "job": job,
+        "started_at": datetime.fromtimestamp(started, timezone.utc).isoformat(),
+        "finished_at": datetime.fromtimestamp(finished, timezone.utc).isoformat(),
+        "duration_seconds": round(finished - started, 3),
+        "histograms": histograms,
+        "counters": counters,
+    }
+
+
+def _write(path, text):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(path + ".tmp", path)
+
+
+def write_reports(job, started, finished=None, report_dir=REPORT_DIR):
+    os.makedirs(report_dir, exist_ok=True)
+    finished = finished or time.time()
+    _write(os.path.join(report_dir, f"{job}.json"), json.dumps(report(job, started, finished), indent=2) + "\n")
+    _write(os.path.join(report_dir, f"{job}.prom"), prometheus_text(job))
+
+
+@contextmanager
+def run_report(job, profile=False, report_dir=REPORT_DIR):
+    """Time a whole run and write its reports on the way out, even if it fails."""
+    started = time.time()
+    profiler = cProfile.Profile() if profile else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        with timer("run_seconds"):
+            yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(report_dir, exist_ok=True)
+            profiler.dump_stats(os.path.join(report_dir, f"{job}.prof"))
+            summary = io.StringIO()
+            pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(PROFILE_TOP)
+            logging.info("Profile of %s (top %d by cumulative time):\n%s", job, PROFILE_TOP, summary.getvalue())
+        write_reports(job, started, report_dir=report_dir)
+        logging.info("Wrote %s run report to %s.", job, report_dir)
@@ -0,0 +1,273 @@
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import metrics
+
+# Batched zero-shot scoring with an NLI model.
+#
+# This does what transformers' zero-shot-classification pipeline does with
+# multi_label=True: every (article, label) pair becomes a premise/hypothesis
+# input, and the label's score is the entailment probability from a softmax
+# over the contradiction and entailment logits. The pipeline sends one article
+# (one pair per label) through the model at a time. Here all pairs of a run are
+# sorted by token length and sent in fixed-size batches, so the padding inside
+# each batch stays small.
+#
+# torch and transformers are imported where they are first needed, so that
+# classify.py can hand work to a running classifier_service without paying
+# their import cost.
+
+MODEL_ID = "facebook/bart-large-mnli"
+HYPOTHESIS_TEMPLATE = "This example is {}."
+BATCH_SIZE = 8
+
+# Inference runtimes. "torch" is the reference; "int8" applies PyTorch dynamic
+# int8 quantization to the Linear layers; "onnx" and "onnx-int8" export the
+# model once to ONNX (optionally int8-quantized) and run it with ONNX Runtime,
+# which needs the optional optimum[onnxruntime] package.
+BACKENDS = ["torch", "int8", "onnx", "onnx-int8"]
+ONNX_DIR = os.path.join(".cache", "onnx")
+
+
+def pair_layout(tokenizer):
+    """Special tokens placed before, between and after a premise/hypothesis pair.
+
+    Found by encoding a sample pair, so pairs can be built from cached token
+    ids for any tokenizer (e.g. "<s> A </s></s> B </s>" for BART).
+    """
+    premise = tokenizer.encode("premise", add_special_tokens=False)
+    hypothesis = tokenizer.encode("hypothesis", add_special_tokens=False)
+    full = tokenizer("premise", "hypothesis")["input_ids"]
+
+    def find(sequence, start):
+        for i in range(start, len(full) - len(sequence) + 1):
+            if full[i:i + len(sequence)] == sequence:
+                return i
+        raise ValueError("Could not locate the pair segments in the tokenizer output.")
+
+    i = find(premise, 0)
+    j = find(hypothesis, i + len(premise))
+    return full[:i], full[i + len(premise):j], full[j + len(hypothesis):]
+
+
+class NLIScorer:
+    """Score (premise, label) pairs with an NLI sequence classification model."""
+
+    def __init__(self, model, tokenizer, model_id=MODEL_ID,
+                 hypothesis_template=HYPOTHESIS_TEMPLATE, max_length=None):
+        # ONNX Runtime models have no train/eval modes
+        self.model = model.eval() if hasattr(model, "eval") else model
+        self.tokenizer = tokenizer
+        self.model_id = model_id
+        self.hypothesis_template = hypothesis_template
+
+        # Same entailment/contradiction indices the zero-shot pipeline uses
+        self.entailment_id = -1
+        for label, index in model.config.label2id.items():
+            if label.lower().startswith("entail"):
+                self.entailment_id = index
+        self.contradiction_id = -1 if self.entailment_id == 0 else 0
+
+        limits = [tokenizer.model_max_length, getattr(model.config, "max_position_embeddings", None)]
+        self.max_length = max_length or min(limit for limit in limits if limit)
+        self.pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else 0
+        self.prefix, self.middle, self.suffix = pair_layout(tokenizer)
+        self.uses_token_types = "token_type_ids" in tokenizer.model_input_names
+        self._hypotheses = {}
+
+    @classmethod
+    def from_pretrained(cls, model_id=MODEL_ID, **kwargs):
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+        logging.info("Loading NLI model %s.", model_id)
+        tokenizer = AutoTokenizer.from_pretrained(model_id)
+        model = AutoModelForSequenceClassification.from_pretrained(model_id)
+        return cls(model, tokenizer, model_id=model_id, **kwargs)
+
+    @classmethod
+    def from_pipeline(cls, classifier, **kwargs):
+        """Wrap the model and tokenizer of an existing zero-shot pipeline."""
+        return cls(classifier.model, classifier.tokenizer,
+                   model_id=classifier.model.name_or_path, **kwargs)
+
+    def encode_premise(self, text):
+        return self.tokenizer.encode(text, add_special_tokens=False)
+
+    def encode_hypothesis(self, label):
+        if label not in self._hypotheses:
+            hypothesis = self.hypothesis_template.format(label)
+            self._hypotheses[label] = self.tokenizer.encode(hypothesis, add_special_tokens=False)
+        return self._hypotheses[label]
+
+    def build_pair(self, premise_ids, hypothesis_ids):
+        """Model input ids for a pair, truncating only the premise (like truncation="only_first")."""
+        special = len(self.prefix) + len(self.middle) + len(self.suffix)
+        budget = max(self.max_length - special - len(hypothesis_ids), 0)
+        premise_ids = list(premise_ids[:budget])
+        first = self.prefix + premise_ids + self.middle
+        return first + list(hypothesis_ids) + self.suffix, len(first)
+
+    def _run_batch(self, encoded):
+        import torch
+
+        width = max(len(ids) for ids, _ in encoded)
+        input_ids = torch.full((len(encoded), width), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(encoded), width), dtype=torch.long)
+        token_type_ids = torch.zeros((len(encoded), width), dtype=torch.long)
+        for row, (ids, first_length) in enumerate(encoded):
+            input_ids[row, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+            attention_mask[row, :len(ids)] = 1
+            token_type_ids[row, first_length:len(ids)] = 1
+
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if self.uses_token_types:
+            inputs["token_type_ids"] = token_type_ids
+        with torch.inference_mode():
+            logits = self.model(**inputs).logits
+        entail_contr = logits[:, [self.contradiction_id, self.entailment_id]]
+        return entail_contr.softmax(dim=-1)[:, 1].tolist()
+
+    def score_pairs(self, pairs, batch_size=BATCH_SIZE):
+        """Return the entailment score of each (premise_ids, label) pair, in input order.
+
+        Pairs are bucketed by length so each batch pads to a similar width.
+        """
+        encoded = [self.build_pair(premise_ids, self.encode_hypothesis(label))
+                   for premise_ids, label in pairs]
+        order = sorted(range(len(encoded)), key=lambda k: len(encoded[k][0]))
+        scores = [0.0] * len(encoded)
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            with metrics.timer("nli_batch_seconds", model=self.model_id):
+                batch_scores = self._run_batch([encoded[k] for k in batch])
+            for k, score in zip(batch, batch_scores):
+                scores[k] = score
+        return scores
+
+    def classify(self, texts, labels, batch_size=BATCH_SIZE):
+        """Score every text against every label; returns one {label: score} dict per text."""
+        premises = [self.encode_premise(text) for text in texts]
+        pairs = [(premise, label) for premise in premises for label in labels]
+        scores = self.score_pairs(pairs, batch_size)
+        results = []
+        for i in range(len(texts)):
+            row = scores[i * len(labels):(i + 1) * len(labels)]
+            # Highest score first, matching the pipeline's label order
+            results.append(dict(sorted(zip(labels, row), key=lambda item: item[1], reverse=True)))
+        return results
+
+
+def backend_model_key(model_id, backend):
+    """Model id recorded with scores, so scores from different runtimes never mix."""
+    return model_id if backend == "torch" else f"{model_id}@{backend}"
+
+
+def _load_onnx(model_id, quantize):
+    from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    export_dir = os.path.join(ONNX_DIR, model_id.strip("/").replace("/", "--"))
+    if not os.path.exists(os.path.join(export_dir, "model.onnx")):
+        logging.info("Exporting %s to ONNX in %s.", model_id, export_dir)
+        model = ORTModelForSequenceClassification.from_pretrained(model_id, export=True)
+        model.save_pretrained(export_dir)
+    if not quantize:
+        return ORTModelForSequenceClassification.from_pretrained(export_dir, provider="CPUExecutionProvider")
+
+    quantized_dir = export_dir + "-int8"
+    if not os.path.exists(os.path.join(quantized_dir, "model_quantized.onnx")):
+        logging.info("Quantizing the ONNX export of %s to int8 in %s.", model_id, quantized_dir)
+        quantizer = ORTQuantizer.from_pretrained(export_dir)
+        quantizer.quantize(save_dir=quantized_dir,
+                           quantization_config=AutoQuantizationConfig.avx2(is_static=False, per_channel=False))
+    return ORTModelForSequenceClassification.from_pretrained(
+        quantized_dir, file_name="model_quantized.onnx", provider="CPUExecutionProvider")
+
+
+def load_scorer(model_id=MODEL_ID, backend="torch", **kwargs):
+    """Load an NLIScorer running on the given inference backend."""
+    if backend == "torch":
+        return NLIScorer.from_pretrained(model_id, **kwargs)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    logging.info("Loading NLI model %s with the %s backend.", model_id, backend)
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    if backend == "int8":
+        model = AutoModelForSequenceClassification.from_pretrained(model_id).eval()
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    else:
+        model = _load_onnx(model_id, quantize=backend == "onnx-int8")
+    return NLIScorer(model, tokenizer, model_id=backend_model_key(model_id, backend), **kwargs)
+
+
+# Model held by each ScorerPool worker process, loaded once by _init_worker
+_worker_scorer = None
+
+
+def _init_worker(model_id, backend, threads, kwargs):
+    import torch
+
+    global _worker_scorer
+    torch.set_num_threads(threads)
+    _worker_scorer = load_scorer(model_id, backend, **kwargs)
+
+
+def _score_batch(pairs):
+    return _worker_scorer.score_pairs(pairs, batch_size=len(pairs))
+
+
+class ScorerPool:
+    """Runs NLIScorer.score_pairs across worker processes, one model per worker.
+
+    Premises are tokenized in the parent; batches are built exactly as in the
+    single-process scorer and handed out to the workers, and results are put
+    back by index, so the output does not depend on the number of workers.
+    """
+
+    def __init__(self, model_id=MODEL_ID, backend="torch", workers=2, threads_per_worker=None, **kwargs):
+        threads = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+        logging.info("Starting %d classifier workers with %d threads each.", workers, threads)
+        self.model_id = backend_model_key(model_id, backend)
+        self.hypothesis_template = kwargs.get("hypothesis_template", HYPOTHESIS_TEMPLATE)
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+        # spawn rather than fork: forking a process with live torch threads can deadlock
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_id, backend, threads, kwargs),
+        )
+
+    def encode_premise(self, text):
+        return self.tokenizer.encode(text, add_special_tokens=False)
+
+    def score_pairs(self, pairs, batch_size=BATCH_SIZE):
+        pairs = list(pairs)
+        order = sorted(range(len(pairs)), key=lambda k: len(pairs[k][0]))
+        batches = [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+        scores = [0.0] * len(pairs)
+        results = self.executor.map(_score_batch, [[pairs[k] for k in batch] for batch in batches])
+        for batch, batch_scores in zip(batches, results):
+            for k, score in zip(batch, batch_scores):
+                scores[k] = score
+        return scores
+
+    def classify(self, texts, labels, batch_size=BATCH_SIZE):
+        return NLIScorer.classify(self, texts, labels, batch_size)
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,247 @@
+import os
+import logging
+
+from bs4 import BeautifulSoup
+from bs4.dammit import UnicodeDammit
+
+# Pluggable HTML parsing layer.
+#
+# The scrapers only ever need the <a href> values of a listing page and the
+# <h1>, <h2> and body text of an article, and the dashboard only needs plain
+# text. Each backend below extracts exactly those pieces. When lxml or
+# selectolax is installed the C-backed parser is used; otherwise everything
+# falls back to BeautifulSoup with html.parser. Text is collected the way
+# BeautifulSoup's get_text() does it (no <script>/<style>/<template> contents,
+# no comments), so every backend produces the same output on well-formed
+# pages. Line breaks are normalized to "\n" before parsing, as HTML5 requires
+# and the C parsers would do anyway, so "\r\n" and "\r" come out the same too.
+# Set PARSER_BACKEND=bs4|lxml|selectolax to force a backend, and run
+# bench_parse.py to compare their speed and output.
+
+try:
+    import lxml.html
+    import lxml.etree
+except ImportError:  # optional dependency
+    lxml = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:  # optional dependency
+    HTMLParser = None
+
+# Elements whose text BeautifulSoup leaves out of get_text()
+SKIP_TEXT_TAGS = {"script", "style", "template"}
+
+# Preferred order when no backend is forced
+BACKEND_ORDER = ["lxml", "selectolax", "bs4"]
+
+
+def _decode(html):
+    # Decode bytes the same way BeautifulSoup would, and normalize line breaks
+    # the way the C parsers do, so every backend sees the same text
+    if isinstance(html, bytes):
+        html = UnicodeDammit(html, is_html=True).unicode_markup or ""
+    return html.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def join_strings(strings, strip=False, separator=""):
+    """Join text pieces the way BeautifulSoup's get_text(separator, strip) does."""
+    if strip:
+        strings = (s.strip() for s in strings)
+        strings = (s for s in strings if s)
+    return separator.join(strings)
+
+
+class Bs4Backend:
+    name = "bs4"
+
+    def parse(self, html):
+        return BeautifulSoup(_decode(html), "html.parser")
+
+    def hrefs(self, doc):
+        return [a["href"] for a in doc.find_all("a", href=True)]
+
+    def first(self, doc, tag):
+        return doc.find(tag)
+
+    def by_id(self, doc, element_id):
+        return doc.find(id=element_id)
+
+    def find_all(self, doc, tag):
+        return doc.find_all(tag)
+
+    def strings(self, node):
+        return node.strings
+
+
+class LxmlBackend:
+    name = "lxml"
+
+    def parse(self, html):
+        html = _decode(html)
+        try:
+            return lxml.html.document_fromstring(html)
+        except ValueError:
+            # Strings carrying an XML encoding declaration must be parsed as bytes
+            return lxml.html.document_fromstring(html.encode("utf-8"))
+        except lxml.etree.ParserError:
+            # Empty or whitespace-only document
+            return lxml.html.document_fromstring("<html></html>")
+
+    def hrefs(self, doc):
+        return [a.get("href") for a in doc.iter("a") if a.get("href") is not None]
+
+    def first(self, doc, tag):
+        return next(doc.iter(tag), None)
+
+    def by_id(self, doc, element_id):
+        found = doc.xpath("//*[@id=$element_id]", element_id=element_id)
+        return found[0] if found else None
+
+    def find_all(self, doc, tag):
+        return list(doc.iter(tag))
+
+    def strings(self, node):
+        if node.text:
+            yield node.text
+        # Iterative walk so deeply nested pages cannot hit the recursion limit.
+        # Each stack entry is (children iterator, element owning them); an
+        # element's tail text follows once all of its children are done.
+        stack = [(iter(node), None)]
+        while stack:
+            children, owner = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                if owner is not None and owner.tail:
+                    yield owner.tail
+                continue
+            if isinstance(child.tag, str) and child.tag not in SKIP_TEXT_TAGS:
+                if child.text:
+                    yield child.text
+                stack.append((iter(child), child))
+            elif child.tail:
+                # Comments, processing instructions and skipped tags: tail only
+                yield child.tail
+
+
+class SelectolaxBackend:
+    name = "selectolax"
+
+    def parse(self, html):
+        return HTMLParser(_decode(html))
+
+    def hrefs(self, doc):
+        return [a.attributes["href"] for a in doc.css("a[href]")
+                if a.attributes.get("href") is not None]
+
+    def first(self, doc, tag):
+        return doc.css_first(tag)
+
+    def by_id(self, doc, element_id):
+        escaped = element_id.replace("\\", "\\\\").replace('"', '\\"')
+        return doc.css_first(f'[id="{escaped}"]')
+
+    def find_all(self, doc, tag):
+        return doc.css(tag)
+
+    def strings(self, node):
+        # Depth-first walk in document order using the child/next links
+        stack = [node.child] if node.child is not None else []
+        while stack:
+            current = stack.pop()
+            if current.next is not None:
+                stack.append(current.next)
+            if current.tag == "-text":
+                yield current.text_content
+            elif current.tag not in SKIP_TEXT_TAGS and current.tag != "-comment" \
+                    and current.child is not None:
+                stack.append(current.child)
+
+
+BACKENDS = {
+    "bs4": Bs4Backend,
+    "lxml": LxmlBackend,
+    "selectolax": SelectolaxBackend,
+}
+
+
+def available_backends():
+    available = {"bs4"}
+    if lxml is not None:
+        available.add("lxml")
+    if HTMLParser is not None:
+        available.add("selectolax")
+    return [name for name in BACKEND_ORDER if name in available]
+
+
+_default_backend = None
+
+
+def get_backend(name=None):
+    """Return a parser backend by name, or the fastest one installed."""
+    global _default_backend
+    if name:
+        if name not in available_backends():
+            raise ValueError(f"Parser backend not available: {name}")
+        return BACKENDS[name]()
+    if _default_backend is None:
+        forced = os.environ.get("PARSER_BACKEND")
+        if forced and forced not in available_backends():
+            logging.warning("PARSER_BACKEND=%s is not installed; falling back.", forced)
+            forced = None
+        _default_backend = BACKENDS[forced or available_backends()[0]]()
+        logging.info("Using %s HTML parser backend.", _default_backend.name)
+    return _default_backend
+
+
+def _node_text(backend, node):
+    return join_strings(backend.strings(node))
+
+
+def extract_body_article_body(backend, doc):
+    # Article content from the element with id 'article-body'
+    body_tag = backend.by_id(doc, "article-body")
+    return _node_text(backend, body_tag).strip() if body_tag is not None else ""
+
+
+def extract_body_paragraphs(backend, doc):
+    # Article content from all <p> tags joined together
+    return "\n".join(join_strings(backend.strings(p), strip=True) for p in backend.find_all(doc, "p"))
+
+
+BODY_EXTRACTORS = {
+    "article_body": extract_body_article_body,
+    "paragraphs": extract_body_paragraphs,
+}
+
+
+def extract_hrefs(html, backend=None):
+    """Return every <a href> value on the page, in document order."""
+    backend = backend or get_backend()
+    return backend.hrefs(backend.parse(html))
+
+
+def extract_article(html, body_extractor, backend=None):
+    """Return the headline, subhead and body text of an article page."""
+    backend = backend or get_backend()
+    doc = backend.parse(html)
+
+    # Headline from <h1>, subhead from <h2> if available
+    hed_tag = backend.first(doc, "h1")
+    subhead_tag = backend.first(doc, "h2")
+    return {
+        "hed": _node_text(backend, hed_tag).strip() if hed_tag is not None else "",
+        "subhead": _node_text(backend, subhead_tag).strip() if subhead_tag is not None else "",
+        "content": BODY_EXTRACTORS[body_extractor](backend, doc),
+    }
+
+
+def html_to_text(html, backend=None):
+    """Plain text of a fragment, like get_text(separator=" ", strip=True)."""
+    backend = backend or get_backend()
+    doc = backend.parse(html)
+    root = doc.root if backend.name == "selectolax" else doc
+    if root is None:
+        return ""
+    return join_strings(backend.strings(root), strip=True, separator=" ")
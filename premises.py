@@ -0,0 +1,184 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import itertools
+
+# Token-budgeted premise construction for NLI classification.
+#
+# Passing an article's full content to the model means tokenizing every
+# paragraph only for the model to truncate at its limit, while boilerplate
+# ("Advertisement", sign-up prompts, photo credits) uses up the budget on
+# shorter pieces. PremiseBuilder instead assembles the premise from the
+# headline, subhead and lead paragraphs until `budget` tokens are used,
+# tokenizing only as much text as it needs. Optionally up to `windows` further
+# chunks of the body, `budget` tokens each, are scored as separate premises and
+# their scores aggregated per label (see classify.classify_articles_batched).
+#
+# Token ids are cached per (content hash, tokenizer, spec), so changing the
+# label set never tokenizes an article again.
+
+TOKEN_BUDGET = 320
+CACHE_FILE = os.path.join(".cache", "classify", "tokens.sqlite")
+MAX_ENTRIES = 200_000
+
+# Paragraphs that carry no signal about the article's topic
+BOILERPLATE = re.compile(
+    r"^(advertisement|sign up|subscribe|read more|click here|follow us|share this|"
+    r"related:|photo:|getty images|©|copyright)",
+    re.IGNORECASE,
+)
+MIN_PARAGRAPH_CHARS = 30
+# Generous upper bound on characters per token, for slicing long paragraphs
+CHARS_PER_TOKEN = 8
+
+
+def paragraphs(content):
+    for paragraph in content.split("\n"):
+        paragraph = paragraph.strip()
+        # Boston Globe bodies inline the ad marker between sentences
+        paragraph = paragraph.replace("Advertisement", " ").strip()
+        if len(paragraph) >= MIN_PARAGRAPH_CHARS and not BOILERPLATE.match(paragraph):
+            yield paragraph
+
+
+class TokenCache:
+    """SQLite cache of premise token ids, with least-recently-used eviction."""
+
+    def __init__(self, path=CACHE_FILE, max_entries=MAX_ENTRIES):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_entries = max_entries
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS premises ("
+            " digest TEXT PRIMARY KEY,"
+            " token_ids TEXT NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    def get(self, digest):
+        row = self.conn.execute("SELECT token_ids FROM premises WHERE digest = ?", (digest,)).fetchone()
+        if row is None:
+            return None
+        self.conn.execute("UPDATE premises SET last_used = ? WHERE digest = ?", (time.time(), digest))
+        return json.loads(row[0])
+
+    def put(self, digest, premises):
+        self.conn.execute("INSERT OR REPLACE INTO premises (digest, token_ids, last_used) VALUES (?, ?, ?)",
+                          (digest, json.dumps(premises), time.time()))
+
+    def commit(self):
+        count = self.conn.execute("SELECT COUNT(*) FROM premises").fetchone()[0]
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM premises WHERE rowid IN"
+                " (SELECT rowid FROM premises ORDER BY last_used LIMIT ?)", (count - self.max_entries,))
+        self.conn.commit()
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+
+class PremiseBuilder:
+    """Builds premises with the tokenizer of `scorer` (an NLIScorer, ScorerPool or ServiceClient).
+
+    The tokenizer is only touched on a token cache miss, so a ServiceClient
+    does not load one when every premise is cached.
+    """
+
+    def __init__(self, scorer, budget=TOKEN_BUDGET, windows=0, aggregate="max", cache=None):
+        if aggregate not in ("max", "mean"):
+            raise ValueError(f"Unknown window aggregation: {aggregate}")
+        self.scorer = scorer
+        # Backends of one model share its tokenizer
+        self.tokenizer_id = scorer.model_id.split("@")[0]
+        self.budget = budget
+        self.windows = windows
+        self.aggregate = aggregate
+        self.cache = cache
+
+    @staticmethod
+    def spec_for(budget, windows=0, aggregate="max"):
+        """Recorded with the scores, since a different premise gives different scores."""
+        if not budget:
+            return None
+        spec = f"budget={budget}"
+        if windows:
+            spec += f";windows={windows};aggregate={aggregate}"
+        return spec
+
+    @property
+    def spec(self):
+        return self.spec_for(self.budget, self.windows, self.aggregate)
+
+    def digest(self, article):
+        key = json.dumps([article.get("hed", ""), article.get("subhead", ""), article.get("content", ""),
+                          self.tokenizer_id, self.spec])
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _encode(self, text):
+        return self.scorer.tokenizer.encode(text, add_special_tokens=False)
+
+    def _texts(self, article):
+        # Headline, subhead, then body paragraphs, joined by newlines. Long
+        # paragraphs (Globe bodies are often one) are cut into slices so that
+        # only about as much text as the budget needs is tokenized.
+        heads = [article.get("hed", "").strip(), article.get("subhead", "").strip()]
+        first = True
+        for paragraph in itertools.chain(filter(None, heads), paragraphs(article.get("content", ""))):
+            for k, piece in enumerate(_slices(paragraph, self.budget * CHARS_PER_TOKEN)):
+                yield piece if first or k else "\n" + piece
+                first = False
+
+    def _tokenize(self, article):
+        # The lead premise, then up to `windows` more, each of `budget` tokens
+        premises = []
+        tokens = []
+        for text in self._texts(article):
+            tokens.extend(self._encode(text))
+            while len(tokens) >= self.budget and len(premises) <= self.windows:
+                premises.append(tokens[:self.budget])
+                tokens = tokens[self.budget:]
+            if len(premises) > self.windows:
+                return premises
+        if tokens:
+            premises.append(tokens)
+        if not premises:
+            # No headline and only short paragraphs: fall back to the raw content
+            content = article.get("content", "").strip()
+            premises.append(self._encode(content[:self.budget * CHARS_PER_TOKEN])[:self.budget])
+        return premises
+
+    def build(self, article, digest=None):
+        """Token id lists to score for an article: the lead premise, then any windows."""
+        digest = digest or self.digest(article)
+        if self.cache is not None:
+            cached = self.cache.get(digest)
+            if cached is not None:
+                return cached
+        premises = self._tokenize(article)
+        if self.cache is not None:
+            self.cache.put(digest, premises)
+        return premises
+
+    def combine(self, scores):
+        """Aggregate one label's scores across an article's premises."""
+        if self.aggregate == "mean":
+            return sum(scores) / len(scores)
+        return max(scores)
+
+
+def _slices(text, size):
+    # Cut at the last space before `size` characters; continuations keep that space
+    while len(text) > size:
+        cut = text.rfind(" ", 0, size)
+        if cut <= 0:
+            cut = size
+        yield text[:cut]
+        text = text[cut:]
+    yield text
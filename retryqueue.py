@@ -0,0 +1,62 @@
+import os
+import json
+import time
+import logging
+import threading
+
+# Article URLs whose fetch failed, tried again on later runs.
+#
+# A URL is queued when its page could not be fetched (network error, 429/5xx
+# after retries, or its outlet's circuit breaker was open) and removed once it
+# is scraped. After MAX_ATTEMPTS failed runs, or on a permanent error such as
+# a 404, it is dropped and logged. The queue is a small JSON file committed
+# alongside seen_urls.txt, so it survives between CI runs.
+
+RETRY_FILE = "retry_queue.json"
+MAX_ATTEMPTS = 5
+# Status codes that will not get better by trying again
+PERMANENT_STATUSES = {400, 401, 403, 404, 410}
+
+
+class RetryQueue:
+    def __init__(self, path=RETRY_FILE):
+        self.path = path
+        # Scrapers for several outlets record failures at once
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        if self.entries:
+            logging.info("Loaded %d URLs to retry from %s.", len(self.entries), path)
+
+    def pending(self, site_name):
+        """URLs of this outlet waiting to be fetched again."""
+        with self._lock:
+            return sorted(url for url, entry in self.entries.items() if entry["site"] == site_name)
+
+    def failed(self, url, site_name, reason, status=None):
+        with self._lock:
+            entry = self.entries.get(url, {"site": site_name, "attempts": 0})
+            entry["attempts"] += 1
+            entry["error"] = str(reason)
+            entry["last_tried"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            if status in PERMANENT_STATUSES or entry["attempts"] >= MAX_ATTEMPTS:
+                self.entries.pop(url, None)
+                logging.error("[%s] Giving up on %s after %d attempts: %s",
+                              site_name, url, entry["attempts"], reason)
+            else:
+                self.entries[url] = entry
+                logging.warning("[%s] Queued %s for retry (attempt %d): %s",
+                                site_name, url, entry["attempts"], reason)
+
+    def succeeded(self, url):
+        with self._lock:
+            self.entries.pop(url, None)
+
+    def save(self):
+        with self._lock:
+            with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, indent=2, sort_keys=True)
+                f.write("\n")
+            os.replace(self.path + ".tmp", self.path)
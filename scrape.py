@@ -0,0 +1,230 @@
+import re
+import requests
+import argparse
+import logging
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urljoin
+
+from tqdm import tqdm
+
+import dedup
+import metrics
+import parsing
+import search
+import store
+import urlindex
+from fetcher import Fetcher
+from retryqueue import RetryQueue
+from httpcache import ResponseCache, cache_enabled
+from sites import SITES, get_site
+
+# Set up logging to a file named 'scrape.log'
+logging.basicConfig(
+    filename='scrape.log',
+    level=logging.INFO,
+    format='%(asctime)s %(levelname)s: %(message)s'
+)
+
+DATE_PATTERN = re.compile(r"/(\d{4})/(\d{2})/(\d{2})")
+
+
+def extract_links(site, html):
+    """Return the unique, absolute article links found on a listing page."""
+    patterns = [re.compile(p) for p in site["link_patterns"]]
+    hrefs = [
+        href for href in parsing.extract_hrefs(html)
+        if all(p.search(href) for p in patterns)
+    ]
+    logging.info("[%s] Found %d candidate article links.", site["site_name"], len(hrefs))
+    return sorted({urlindex.canonicalize_url(urljoin(site["base_url"], href)) for href in hrefs})
+
+
+def parse_pub_date(site, url):
+    """Return (raw_pub_date, pub_date) from the /YYYY/MM/DD part of the URL."""
+    date_match = DATE_PATTERN.search(url)
+    if not date_match:
+        return "", ""
+    year, month, day = date_match.groups()
+    raw_pub_date = f"{year}-{month}-{day}"
+    try:
+        # Stored as an ISO formatted string (e.g., "2025-03-14T00:00:00")
+        pub_date = datetime(int(year), int(month), int(day)).isoformat()
+    except ValueError as e:
+        logging.error("[%s] Error parsing date for %s: %s", site["site_name"], url, e)
+        pub_date = ""
+    return raw_pub_date, pub_date
+
+
+def parse_article(site, url, html):
+    # Only the headline, subhead and body are extracted from the page
+    extracted = parsing.extract_article(html, site["body_extractor"])
+    raw_pub_date, pub_date = parse_pub_date(site, url)
+
+    return {
+        "url": url,
+        "raw_pub_date": raw_pub_date,
+        "pub_date": pub_date,
+        "hed": extracted["hed"],
+        "subhead": extracted["subhead"],
+        "content": extracted["content"],
+        "Outlet": site["site_name"]
+    }
+
+
+def scrape_site(site, fetcher, scraped_urls, on_article=None, retry_queue=None, defer=None):
+    """Scrape one outlet's listing page and return its new articles.
+
+    on_article, if given, is called with each new article as soon as it is
+    parsed, while the remaining pages are still being fetched. Article pages
+    that fail are recorded in retry_queue, whose earlier failures for this
+    outlet are fetched again along with the new links.
+
+    Clearing an article from retry_queue and caching the listing (so the
+    next run gets a 304) must wait until the articles are stored. defer, if
+    given, takes those actions and runs them once the articles passed to
+    on_article so far are committed (see stream.py); otherwise they run
+    straight away.
+    """
+    site_name = site["site_name"]
+    settle = defer or (lambda action: action())
+    logging.info("[%s] Starting scraping process for %s", site_name, site["scrape_url"])
+    retry_links = retry_queue.pending(site_name) if retry_queue is not None else []
+    try:
+        response = fetcher.get(site["scrape_url"], conditional=True)
+    except requests.RequestException as e:
+        logging.error("[%s] Failed to retrieve main page: %s", site_name, e)
+        response = None
+    if response is not None and response.status_code == 304:
+        logging.info("[%s] Listing page unchanged since last run.", site_name)
+        full_links = []
+    elif response is None or response.status_code != 200:
+        if response is not None:
+            logging.error("[%s] Failed to retrieve main page. Status code: %s", site_name, response.status_code)
+        full_links = []
+    else:
+        logging.info("[%s] Homepage fetched successfully.", site_name)
+        full_links = extract_links(site, response.content)
+        logging.info("[%s] After deduplication, %d full links remain.", site_name, len(full_links))
+    listing_ok = response is not None and response.status_code in (200, 304)
+
+    def save_listing():
+        fetcher.cache.save(site["scrape_url"], response)
+
+    if not full_links and not retry_links:
+        if fetcher.cache is not None and listing_ok:
+            save_listing()
+        return []
+
+    # Skip links we already have before fetching anything
+    to_fetch = []
+    for article_link in full_links + [link for link in retry_links if link not in full_links]:
+        if article_link in scraped_urls:
+            logging.debug("[%s] Already scraped: %s", site_name, article_link)
+            if retry_queue is not None:
+                retry_queue.succeeded(article_link)
+        else:
+            to_fetch.append(article_link)
+    logging.info("[%s] Fetching %d new article pages (%d queued from earlier runs).",
+                 site_name, len(to_fetch), len(retry_links))
+
+    def on_error(article_link, error):
+        if retry_queue is not None:
+            retry_queue.failed(article_link, site_name, error)
+
+    new_articles = []
+    # Closed explicitly, so requests still queued are cancelled if on_article raises
+    with closing(fetcher.fetch_all(to_fetch, on_error)) as responses:
+        for article_link, article_response in tqdm(responses, total=len(to_fetch),
+                                                   desc=f"Scraping {site_name} Articles"):
+            if article_response is None:
+                continue
+            if article_response.status_code == 200:
+                with metrics.timer("parse_seconds", site=site_name):
+                    article = parse_article(site, article_link, article_response.content)
+                metrics.inc("articles_scraped_total", site=site_name)
+                new_articles.append(article)
+                if on_article is not None:
+                    on_article(article)
+                if retry_queue is not None:
+                    settle(lambda link=article_link: retry_queue.succeeded(link))
+                logging.debug("[%s] Scraped article successfully: %s", site_name, article_link)
+            else:
+                logging.error("[%s] Failed to retrieve article: %s (status code: %s)",
+                              site_name, article_link, article_response.status_code)
+                if retry_queue is not None:
+                    retry_queue.failed(article_link, site_name, f"status code {article_response.status_code}",
+                                       article_response.status_code)
+
+    if not new_articles:
+        logging.info("[%s] No new articles were found.", site_name)
+    # Only remember the listing once its links have been handled
+    if fetcher.cache is not None and listing_ok:
+        settle(save_listing)
+    return new_articles
+
+
+def scrape_sites(sites, scraped_urls, use_cache=True, on_article=None, retry_queue=None, defer=None):
+    """Crawl every outlet concurrently and return all new articles (see scrape_site for the callbacks)."""
+    cache = ResponseCache() if use_cache and cache_enabled() else None
+    retry_queue = retry_queue if retry_queue is not None else RetryQueue()
+    with Fetcher(cache=cache) as fetcher, ThreadPoolExecutor(max_workers=max(len(sites), 1)) as pool:
+        futures = [pool.submit(scrape_site, site, fetcher, scraped_urls, on_article, retry_queue, defer)
+                   for site in sites]
+        results = []
+        for site, future in zip(sites, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logging.exception("[%s] Scrape failed: %s", site["site_name"], e)
+    retry_queue.save()
+    # Merge in registry order so the output is the same on every run
+    new_articles = []
+    seen = set()
+    for articles in results:
+        for article in articles:
+            if article["url"] not in seen:
+                seen.add(article["url"])
+                new_articles.append(article)
+    return new_articles
+
+
+def run(site_names=None, store_file=store.STORE_FILE, use_cache=True):
+    sites = [get_site(name) for name in site_names] if site_names else SITES
+
+    # One load of the seen-URL index for every outlet in the run
+    scraped_urls = urlindex.load_seen(store_file=store_file)
+
+    new_articles = scrape_sites(sites, scraped_urls, use_cache)
+    if new_articles:
+        # Mark near-duplicates of stored articles, and of each other
+        duplicates = dedup.DuplicateIndex(store_file=store_file)
+        for article in new_articles:
+            duplicates.assign(article)
+        duplicates.save()
+        # Append only the new articles; the rest of the store is untouched
+        store.upsert(new_articles, store_file)
+        urlindex.add_seen([article["url"] for article in new_articles])
+        search.add_articles(new_articles)
+        logging.info("Saved %d new articles to %s.", len(new_articles), store_file)
+    else:
+        logging.info("No new articles were found.")
+    return new_articles
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape real estate articles from every registered outlet.")
+    parser.add_argument("--site", action="append", dest="sites", metavar="SITE_NAME",
+                        help="Only scrape this outlet (may be repeated). Defaults to every outlet in sites.py.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always download listing pages in full instead of revalidating the HTTP cache.")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"Profile the run with cProfile (written to {metrics.REPORT_DIR}/scrape.prof).")
+    args = parser.parse_args()
+    with metrics.run_report("scrape", profile=args.profile):
+        run(args.sites, use_cache=not args.no_cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+import os
+import json
+import sqlite3
+import hashlib
+import logging
+import argparse
+import threading
+from datetime import datetime
+
+import store
+
+# Full-text search over headlines, subheads and article bodies.
+#
+# An SQLite FTS5 index (porter-stemmed, unicode61 tokens) keyed by article URL.
+# The scrapers add new articles to SEARCH_FILE as they commit them, and the
+# dashboard syncs its copy with each corpus version it loads; both only touch
+# articles whose text changed. Results are ranked by BM25 with the headline
+# weighted above the subhead and the subhead above the body.
+#
+# Ranking every match of a broad query ("kitchen" hits nearly every article)
+# costs far more than finding them, so only the MAX_CANDIDATES most recently
+# published matches are ranked. Document ids start with the publication time
+# (see doc_id_base), so FTS5 walks matches newest first and stops at the cap.
+# Callers with filters pass the ids (see doc_ids) of the articles that pass
+# them, and the cap applies to those only. Below that many matches the
+# ranking is exact.
+#
+# Set SEARCH_INDEX=0 to have the scrapers skip indexing (CI does: the index is
+# only read by a local dashboard).
+#
+#   python search.py "seaport lab space"    # query the index
+#   python search.py --rebuild              # rebuild it from the store
+
+SEARCH_FILE = os.path.join(".cache", "search", "articles.sqlite")
+# BM25 column weights for hed, subhead and content
+WEIGHTS = (10.0, 4.0, 1.0)
+MAX_RESULTS = 1000
+# Matches ranked per query, newest first; keeps broad queries on 100k articles well under 100 ms
+MAX_CANDIDATES = 10_000
+# Low bits of a document id, numbering articles published in the same second
+ID_SEQUENCE_BITS = 16
+# PRAGMA user_version of the index; an index with older ids is rebuilt
+SCHEMA_VERSION = 1
+# Shorter last terms are matched as whole words: a one-letter prefix expands to most of the vocabulary
+MIN_PREFIX = 2
+
+
+def text_digest(article):
+    # The publication date is part of the id, so a changed date re-indexes the article too
+    key = json.dumps([article.get("hed", ""), article.get("subhead", ""), article.get("content", ""),
+                      article.get("pub_date") or ""])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def doc_id_base(article):
+    """Smallest document id of an article published when this one was; undated articles sort first."""
+    try:
+        seconds = int(datetime.fromisoformat(article.get("pub_date") or "").timestamp())
+    except ValueError:
+        seconds = 0
+    return max(seconds, 0) << ID_SEQUENCE_BITS
+
+
+class SearchHits(list):
+    """URLs in rank order; `truncated` is set when more matches were left unranked or cut off."""
+
+    truncated = False
+
+
+def fts_query(text):
+    # Quote every term, so punctuation in addresses and names is never FTS syntax;
+    # the terms are ANDed. The last one is a prefix, for search-as-you-type.
+    words = text.split()
+    terms = ['"' + term.replace('"', '""') + '"' for term in words]
+    if terms and len(words[-1]) >= MIN_PREFIX:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+class SearchIndex:
+    def __init__(self, path=SEARCH_FILE):
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        # Shared by the dashboard's script threads
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            # Ids were not ordered by publication time; the next sync or rebuild fills the index again
+            self.conn.execute("DROP TABLE IF EXISTS docs")
+            self.conn.execute("DROP TABLE IF EXISTS docs_fts")
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            " id INTEGER PRIMARY KEY,"
+            " url TEXT NOT NULL UNIQUE,"
+            " digest TEXT NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5("
+            "hed, subhead, content, tokenize = 'porter unicode61')"
+        )
+        self.conn.commit()
+        # Doc ids of the URLs a filtered search may return
+        self._allowed = set()
+        self.conn.create_function("allowed", 1, self._allowed.__contains__)
+        # {url: doc id} as of self._ids_version
+        self._ids = None
+        self._ids_version = None
+        self._writes = 0
+
+    def _next_id(self, article):
+        base = doc_id_base(article)
+        last = self.conn.execute("SELECT max(id) FROM docs WHERE id >= ? AND id < ?",
+                                 (base, base + (1 << ID_SEQUENCE_BITS))).fetchone()[0]
+        return base if last is None else last + 1
+
+    @property
+    def version(self):
+        """Changes whenever documents may have been written, here or by another connection (a scraper)."""
+        with self.lock:
+            return self.conn.execute("PRAGMA data_version").fetchone()[0], self._writes
+
+    def doc_ids(self, urls):
+        """Document ids of `urls` for search(ids=...), None where not indexed; valid while `version` holds."""
+        version = self.version
+        with self.lock:
+            if self._ids is None or self._ids_version != version:
+                self._ids = {url: doc_id for doc_id, url in self.conn.execute("SELECT id, url FROM docs")}
+                self._ids_version = version
+            return [self._ids.get(url) for url in urls]
+
+    def add(self, articles):
+        """Index new articles and re-index changed ones; returns how many were written."""
+        written = 0
+        with self.lock:
+            for article in articles:
+                if not article.get("url"):
+                    continue
+                digest = text_digest(article)
+                row = self.conn.execute("SELECT id, digest FROM docs WHERE url = ?", (article["url"],)).fetchone()
+                if row is not None:
+                    if row[1] == digest:
+                        continue
+                    # Re-inserted under a new id, which follows the publication date
+                    self.conn.execute("DELETE FROM docs_fts WHERE rowid = ?", (row[0],))
+                    self.conn.execute("DELETE FROM docs WHERE id = ?", (row[0],))
+                doc_id = self._next_id(article)
+                self.conn.execute("INSERT INTO docs (id, url, digest) VALUES (?, ?, ?)",
+                                  (doc_id, article["url"], digest))
+                self.conn.execute("INSERT INTO docs_fts (rowid, hed, subhead, content) VALUES (?, ?, ?, ?)",
+                                  (doc_id, article.get("hed", ""), article.get("subhead", ""),
+                                   article.get("content", "")))
+                written += 1
+            self.conn.commit()
+            self._writes += 1
+        return written
+
+    def sync(self, articles):
+        """Make the index match `articles` exactly: add and update, then drop the rest."""
+        written = self.add(articles)
+        urls = {article["url"] for article in articles if article.get("url")}
+        with self.lock:
+            stale = [(doc_id,) for doc_id, url in self.conn.execute("SELECT id, url FROM docs") if url not in urls]
+            self.conn.executemany("DELETE FROM docs_fts WHERE rowid = ?", stale)
+            self.conn.executemany("DELETE FROM docs WHERE id = ?", stale)
+            self.conn.commit()
+            self._writes += 1
+        if written or stale:
+            logging.info("Search index synced: %d articles written, %d removed.", written, len(stale))
+
+    def search(self, text, limit=MAX_RESULTS, ids=None):
+        """URLs matching every term of `text`, best match first, as SearchHits.
+
+        With `ids` (from doc_ids), only those documents are candidates (the
+        dashboard's filtered articles), before the MAX_CANDIDATES and `limit`
+        cuts are made.
+        """
+        hits = SearchHits()
+        query = fts_query(text)
+        if not query:
+            return hits
+        weights = ", ".join(str(weight) for weight in WEIGHTS)
+        # allowed() runs before bm25(), so filtered-out matches are never ranked
+        condition = "" if ids is None else " AND allowed(rowid)"
+        with self.lock:
+            try:
+                if ids is not None:
+                    self._allowed.update(ids)
+                # bm25() is only computed for the candidates the LIMIT lets through, newest first
+                candidates = self.conn.execute(
+                    f"SELECT rowid, bm25(docs_fts, {weights}) FROM docs_fts"
+                    f" WHERE docs_fts MATCH ?{condition} ORDER BY rowid DESC LIMIT ?",
+                    (query, MAX_CANDIDATES + 1),
+                ).fetchall()
+                # Stable, so equal scores stay newest first
+                best = sorted(candidates[:MAX_CANDIDATES], key=lambda candidate: candidate[1])[:limit]
+                urls_of = dict(self.conn.execute(
+                    "SELECT docs.id, docs.url FROM json_each(?) JOIN docs ON docs.id = json_each.value",
+                    (json.dumps([doc_id for doc_id, _ in best]),),
+                ))
+            except sqlite3.OperationalError as e:
+                logging.warning("Search query %r failed: %s", text, e)
+                return hits
+            finally:
+                self._allowed.clear()
+        hits.extend(urls_of[doc_id] for doc_id, _ in best)
+        hits.truncated = len(candidates) > len(best)
+        return hits
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def index_enabled():
+    return os.environ.get("SEARCH_INDEX", "1") not in ("0", "false", "no", "off")
+
+
+def add_articles(articles, path=SEARCH_FILE):
+    # Called by the scrapers as they commit new articles
+    if not index_enabled():
+        return
+    index = SearchIndex(path)
+    try:
+        index.add(articles)
+    finally:
+        index.close()
+
+
+def rebuild(store_file=store.STORE_FILE, path=SEARCH_FILE):
+    index = SearchIndex(path)
+    try:
+        index.sync(store.load_articles(store_file))
+    finally:
+        index.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query or rebuild the full-text search index.")
+    parser.add_argument("query", nargs="*", help="Search terms.")
+    parser.add_argument("--rebuild", action="store_true", help="Sync the index with the article store first.")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.rebuild:
+        rebuild()
+    if args.query:
+        index = SearchIndex()
+        try:
+            for url in index.search(" ".join(args.query), args.limit):
+                print(url)
+        finally:
+            index.close()
+
+
+if __name__ == "__main__":
+    main()
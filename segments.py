@@ -0,0 +1,177 @@
+import os
+import gzip
+import json
+import hashlib
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import requests
+
+import metrics
+import store
+
+# The published corpus, split into monthly gzip segments.
+#
+# Instead of downloading the whole articles.json, which is rewritten in full
+# on every run, the remote dashboard reads what `publish` writes: the merged
+# store in CORPUS_DIR as one segment per publication month, plus a small
+# manifest listing each segment's file, SHA-256 and size. Segments are
+# serialized and compressed deterministically (fixed key order, gzip mtime 0),
+# so a month whose articles did not change keeps the same bytes and hash, and
+# only the months that did change show up in git.
+#
+# The remote dashboard downloads the manifest and then only the segments whose
+# hash it has not seen, keeping the others in SEGMENT_CACHE_DIR; see
+# load_remote(). Its download size depends on what changed, not on the size of
+# the archive.
+#
+# The segments are the only copy of the corpus in git. CI starts without a
+# store, and store.bootstrap() seeds it from CORPUS_DIR (read_published()).
+#
+#   python segments.py publish    # write CORPUS_DIR from the store
+
+CORPUS_DIR = "corpus"
+MANIFEST_FILE = "manifest.json"
+SEGMENT_CACHE_DIR = os.path.join(".cache", "corpus")
+# Articles without a publication date
+UNDATED = "undated"
+FETCH_WORKERS = 8
+
+
+def segment_name(article):
+    """YYYY-MM of the article's publication date, or UNDATED."""
+    pub_date = article.get("pub_date") or ""
+    return pub_date[:7] if len(pub_date) >= 7 and pub_date[4] == "-" else UNDATED
+
+
+def encode_segment(articles):
+    data = json.dumps(articles, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    # mtime=0 keeps the output identical for identical articles
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def decode_segment(payload):
+    return json.loads(gzip.decompress(payload).decode("utf-8"))
+
+
+def _write_atomic(path, payload):
+    with open(path + ".tmp", "wb") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def publish(store_file=store.STORE_FILE, out_dir=CORPUS_DIR):
+    """Write the store as monthly segments plus the manifest; returns the names of changed segments."""
+    os.makedirs(out_dir, exist_ok=True)
+    grouped = {}
+    # Store order within each month, so unchanged months serialize the same way
+    for article in store.load_articles(store_file):
+        grouped.setdefault(segment_name(article), []).append(article)
+
+    manifest = {"format": 1, "articles": 0, "segments": []}
+    changed = []
+    for name in sorted(grouped):
+        payload = encode_segment(grouped[name])
+        filename = f"articles-{name}.json.gz"
+        path = os.path.join(out_dir, filename)
+        existing = None
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                existing = f.read()
+        if existing != payload:
+            _write_atomic(path, payload)
+            changed.append(name)
+        manifest["articles"] += len(grouped[name])
+        manifest["segments"].append({
+            "name": name,
+            "file": filename,
+            "sha256": hashlib.sha256(payload).hexdigest(),
+            "bytes": len(payload),
+            "articles": len(grouped[name]),
+        })
+
+    # Months that no longer have articles
+    listed = {segment["file"] for segment in manifest["segments"]}
+    for filename in os.listdir(out_dir):
+        if filename.startswith("articles-") and filename.endswith(".json.gz") and filename not in listed:
+            os.remove(os.path.join(out_dir, filename))
+            changed.append(filename[len("articles-"):-len(".json.gz")])
+    _write_atomic(os.path.join(out_dir, MANIFEST_FILE), (json.dumps(manifest, indent=2) + "\n").encode("utf-8"))
+    logging.info("Published %d articles in %d segments to %s; %d changed.",
+                 manifest["articles"], len(manifest["segments"]), out_dir, len(changed))
+    return changed
+
+
+def read_published(out_dir=CORPUS_DIR):
+    """Articles of the segments published in out_dir, or None if it has no manifest."""
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    articles = []
+    for segment in manifest["segments"]:
+        with open(os.path.join(out_dir, segment["file"]), "rb") as f:
+            articles.extend(decode_segment(f.read()))
+    return articles
+
+
+def _fetch_segment(session, base_url, segment, headers, cache_dir):
+    path = os.path.join(cache_dir, f"{segment['sha256']}.json.gz")
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            payload = f.read()
+        try:
+            return decode_segment(payload)
+        except (OSError, ValueError):
+            logging.warning("Cached segment %s is corrupt; downloading it again.", segment["name"])
+
+    with metrics.timer("segment_fetch_seconds"):
+        response = session.get(urljoin(base_url, segment["file"]), headers=headers, timeout=30)
+    response.raise_for_status()
+    payload = response.content
+    metrics.inc("remote_bytes_total", len(payload), file="segment")
+    if hashlib.sha256(payload).hexdigest() != segment["sha256"]:
+        # The manifest and segment were caught mid-update; try again on the next check
+        raise requests.RequestException(f"Segment {segment['file']} does not match the manifest.")
+    _write_atomic(path, payload)
+    return decode_segment(payload)
+
+
+def load_remote(base_url, manifest, headers=None, cache_dir=SEGMENT_CACHE_DIR):
+    """Articles of every segment in the manifest, downloading only segments not cached yet.
+
+    Raises requests.RequestException if a segment cannot be downloaded.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    headers = headers or {}
+    with requests.Session() as session, ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+        parts = list(pool.map(lambda segment: _fetch_segment(session, base_url, segment, headers, cache_dir),
+                              manifest["segments"]))
+
+    # Segments the manifest no longer lists are not needed again
+    current = {f"{segment['sha256']}.json.gz" for segment in manifest["segments"]}
+    for filename in os.listdir(cache_dir):
+        if filename.endswith(".json.gz") and filename not in current:
+            os.remove(os.path.join(cache_dir, filename))
+    return [article for part in parts for article in part]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish the article store as monthly compressed segments.")
+    parser.add_argument("command", choices=["publish"], help="publish: write the segments and manifest.")
+    parser.add_argument("--store", default=store.STORE_FILE)
+    parser.add_argument("--out", default=CORPUS_DIR)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+    changed = publish(args.store, args.out)
+    print(f"{len(changed)} segments changed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# Registry of outlets crawled by scrape.py.
+#
+# Each entry declares everything that differs between outlets:
+#   site_name       - name stored in each article's "Outlet" field
+#   base_url        - used to resolve relative article links
+#   scrape_url      - listing page with the latest real estate articles
+#   link_patterns   - regexes that must all match (re.search) a link's href
+#   body_extractor  - how to pull the article body; see parsing.BODY_EXTRACTORS
+#   archive_url     - older listing pages, with {page} for the page number (2, 3, ...),
+#                     walked by backfill.py; None if the outlet has no paginated archive
+#
+# Adding an outlet only means adding an entry here.
+
+SITES = [
+    {
+        "site_name": "Boston Globe",
+        "base_url": "https://www.bostonglobe.com",
+        "scrape_url": "https://www.bostonglobe.com/business/real-estate/",
+        # Relative links that start with /YYYY/MM/DD
+        "link_patterns": [r"^/\d{4}/\d{2}/\d{2}"],
+        "body_extractor": "article_body",
+        # The section front loads older stories with JavaScript; there are no numbered pages
+        "archive_url": None,
+    },
+    {
+        "site_name": "Boston.com",
+        "base_url": "https://www.boston.com",
+        "scrape_url": "https://www.boston.com/category/real-estate/?p1=header_mainnav",
+        "link_patterns": [r"real-estate", r"/\d{4}/\d{2}/\d{2}"],
+        "body_extractor": "paragraphs",
+        # WordPress category pagination
+        "archive_url": "https://www.boston.com/category/real-estate/page/{page}/",
+    },
+    {
+        "site_name": "NY Post",
+        "base_url": "https://nypost.com",
+        "scrape_url": "https://nypost.com/real-estate/",
+        "link_patterns": [r"real-estate", r"/\d{4}/\d{2}/\d{2}"],
+        "body_extractor": "paragraphs",
+        # WordPress category pagination
+        "archive_url": "https://nypost.com/real-estate/page/{page}/",
+    },
+]
+
+
+def get_site(site_name):
+    for site in SITES:
+        if site["site_name"] == site_name:
+            return site
+    raise KeyError(f"Unknown site: {site_name}")
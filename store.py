@@ -0,0 +1,183 @@
+import os
+import json
+import logging
+import argparse
+
+import metrics
+
+# Append-only article store.
+#
+# Every line of STORE_FILE is a JSON object keyed by "url". A line is either a
+# full article or a partial update (e.g. {"url": ..., "classifications": {...}});
+# reading the file merges the lines for each URL in order, so later fields win.
+# Writers only ever append, so saving a handful of articles costs O(new)
+# rather than re-serializing the whole corpus.
+#
+# A batch of several records is written as one line, {"batch": [record, ...]},
+# with a single write() followed by fsync(). A crash can at worst leave a torn
+# final line without a trailing newline; readers ignore it and the next append
+# truncates it. Since a line is only committed once its newline is on disk, a
+# batch is either fully present or not.
+
+STORE_FILE = "articles.jsonl"
+
+# Legacy JSON array, exported for the local dashboard (python store.py export).
+# It is not committed: the remote dashboard reads the monthly segments in
+# corpus/ (see segments.py), which are also what a new store is seeded from.
+JSON_FILE = "articles.json"
+
+
+def read_records(path=STORE_FILE):
+    """Yield each committed record in the store, in write order."""
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                # Torn write from an interrupted batch; never committed
+                logging.warning("Ignoring incomplete record at end of %s.", path)
+                break
+            if line.strip():
+                record = json.loads(line)
+                if "batch" in record and "url" not in record:
+                    yield from record["batch"]
+                else:
+                    yield record
+
+
+def merge_records(records):
+    """Merge records by URL, keeping first-seen order."""
+    articles = {}
+    for record in records:
+        url = record["url"]
+        if url in articles:
+            articles[url].update(record)
+        else:
+            articles[url] = dict(record)
+    return list(articles.values())
+
+
+def _truncate_torn_tail(path):
+    # Drop a partial final line so the next batch starts on a clean line
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+        f.seek(0)
+        data = f.read()
+        f.seek(data.rfind(b"\n") + 1)
+        f.truncate()
+
+
+def upsert(records, path=STORE_FILE):
+    """Atomically append a batch of full or partial article records."""
+    records = list(records)
+    if not records:
+        return 0
+    for record in records:
+        if not record.get("url"):
+            raise ValueError("Every record needs a 'url' key.")
+    # One line per batch: the newline that ends it commits every record at once
+    payload = json.dumps(records[0] if len(records) == 1 else {"batch": records}, ensure_ascii=False) + "\n"
+    with metrics.timer("store_write_seconds"):
+        if os.path.exists(path):
+            _truncate_torn_tail(path)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+    metrics.inc("store_records_written_total", len(records))
+    logging.info("Appended %d records to %s.", len(records), path)
+    return len(records)
+
+
+def _write_atomic(path, write):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def bootstrap(path=STORE_FILE, json_file=JSON_FILE):
+    """Seed the store, if it does not exist yet, from the published segments or else the legacy articles.json."""
+    if os.path.exists(path):
+        return
+    # Imported here: segments builds on this module
+    import segments
+
+    articles, source = segments.read_published(), segments.CORPUS_DIR
+    if articles is None:
+        if not os.path.exists(json_file):
+            return
+        with open(json_file, "r", encoding="utf-8") as f:
+            articles, source = json.load(f), json_file
+    _write_atomic(path, lambda out: out.writelines(
+        json.dumps(article, ensure_ascii=False) + "\n" for article in articles))
+    logging.info("Seeded %s with %d articles from %s.", path, len(articles), source)
+
+
+def load_articles(path=STORE_FILE, json_file=JSON_FILE):
+    bootstrap(path, json_file)
+    articles = merge_records(read_records(path))
+    logging.info("Loaded %d articles from %s.", len(articles), path)
+    return articles
+
+
+def read_articles(path=STORE_FILE, json_file=JSON_FILE):
+    """Articles of the store, or of what bootstrap() would seed it from; writes nothing.
+
+    For read-only callers such as the benchmarks, which must not seed a store
+    in the working tree the way load_articles() does.
+    """
+    if os.path.exists(path):
+        return merge_records(read_records(path))
+    import segments
+
+    published = segments.read_published()
+    if published is not None:
+        return published
+    if not os.path.exists(json_file):
+        return []
+    with open(json_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compact(path=STORE_FILE):
+    """Rewrite the store with one line per article, dropping superseded updates."""
+    articles = merge_records(read_records(path))
+    _write_atomic(path, lambda out: out.writelines(
+        json.dumps(article, ensure_ascii=False) + "\n" for article in articles))
+    logging.info("Compacted %s to %d articles.", path, len(articles))
+    return len(articles)
+
+
+def export_json(path=STORE_FILE, json_file=JSON_FILE):
+    """Write the merged store out as the legacy articles.json array."""
+    articles = load_articles(path, json_file)
+    _write_atomic(json_file, lambda out: json.dump(articles, out, indent=4))
+    logging.info("Exported %d articles to %s.", len(articles), json_file)
+    return len(articles)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the append-only article store.")
+    parser.add_argument("command", choices=["export", "compact"],
+                        help="export: write articles.json from the store; compact: drop superseded records")
+    parser.add_argument("--store", default=STORE_FILE)
+    parser.add_argument("--json-file", default=JSON_FILE)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_json(args.store, args.json_file)
+    else:
+        compact(args.store)
+
+
+if __name__ == "__main__":
+    main()
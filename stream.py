@@ -0,0 +1,226 @@
+import queue
+import logging
+import argparse
+import threading
+
+import scrape
+import search
+import sites
+import store
+import urlindex
+import dedup
+import metrics
+import classify
+from classcache import ClassificationCache
+from retryqueue import RetryQueue
+from nli import MODEL_ID, BATCH_SIZE, BACKENDS
+
+# Streaming scrape-to-classify pipeline.
+#
+# The scrapers push each new article into a bounded queue as soon as it is
+# parsed. A classifier thread loads the model when the first new article
+# arrives (runs that find nothing new never load it), then drains the queue in
+# small batches, classifies them and commits each batch to the store (and the
+# seen-URL index) straight away. Total time is roughly max(fetch, inference)
+# instead of their sum, and articles are saved already classified. If storing
+# fails, the scrapers are stopped, their pending article requests cancelled,
+# and the run raises instead of hanging.
+#
+# A scraper clears an article from the retry queue, and caches its listing
+# page, by queueing that action behind its articles; the worker runs it once
+# they are committed. Articles lost to a failure are fetched again next run.
+
+QUEUE_SIZE = 64
+MAX_BATCH_ARTICLES = 16
+
+# Put on the queue once every scraper has finished
+_DONE = object()
+
+
+def commit(articles, store_file):
+    store.upsert(articles, store_file)
+    urlindex.add_seen([article["url"] for article in articles])
+    search.add_articles(articles)
+
+
+def _run_actions(actions):
+    for action in actions:
+        try:
+            action()
+        except Exception as e:
+            # A listing left uncached or a retry entry left queued only costs a refetch
+            logging.exception("Deferred scraper action failed: %s", e)
+
+
+def classify_worker(articles_queue, classifier_factory, batch_size, store_file, cache, stats, builder_factory=None):
+    # Whatever goes wrong, the queue keeps being drained until _DONE, so the
+    # scrapers (and run()'s final put) never block on a full queue.
+    finished = {"done": False}
+    try:
+        _classify_stream(articles_queue, classifier_factory, batch_size, store_file, cache, stats,
+                         builder_factory, finished)
+    except Exception as e:
+        logging.exception("Streaming classifier failed; stopping the scrape: %s", e)
+        stats["error"] = e
+        while not finished["done"]:
+            finished["done"] = articles_queue.get() is _DONE
+
+
+def _classify_stream(articles_queue, classifier_factory, batch_size, store_file, cache, stats, builder_factory,
+                     finished):
+    try:
+        duplicates = dedup.DuplicateIndex(store_file=store_file)
+    except Exception as e:
+        # Articles are still stored, just without near-duplicate marks
+        logging.exception("Could not load the near-duplicate index: %s", e)
+        duplicates = None
+    # Stored articles by URL, loaded the first time a near-duplicate needs its canonical's scores
+    stored = None
+
+    def canonical(url):
+        nonlocal stored
+        if stored is None:
+            stored = {article["url"]: article for article in store.load_articles(store_file)}
+        return stored.get(url)
+
+    # Loaded with the first new article, so runs that find nothing new never load the model
+    classifier, builder, loaded = None, None, False
+    try:
+        while not finished["done"]:
+            batch = [articles_queue.get()]
+            while len(batch) < MAX_BATCH_ARTICLES:
+                try:
+                    batch.append(articles_queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is _DONE:
+                batch.pop()
+                finished["done"] = True
+            # Deferred scraper actions (see scrape.scrape_site) run once the batch is committed
+            actions = [item for item in batch if callable(item)]
+            batch = [item for item in batch if not callable(item)]
+            if not batch:
+                _run_actions(actions)
+                continue
+
+            if not loaded:
+                loaded = True
+                try:
+                    classifier = classifier_factory()
+                    if builder_factory is not None:
+                        builder = builder_factory(classifier)
+                except Exception as e:
+                    # Articles are stored unclassified and picked up by the next classify.py run
+                    logging.exception("Could not load the classifier: %s", e)
+                    classifier = None
+
+            if duplicates is not None:
+                try:
+                    for article in batch:
+                        duplicates.assign(article)
+                    duplicates.save()
+                except Exception as e:
+                    logging.exception("Near-duplicate detection failed for %d articles: %s", len(batch), e)
+            if classifier is not None:
+                try:
+                    classify.classify_articles(batch, classifier, batch_size, cache, builder, canonical)
+                    stats["classified"] += len(batch)
+                except Exception as e:
+                    logging.exception("Classification failed for %d articles: %s", len(batch), e)
+            commit(batch, store_file)
+            if stored is not None:
+                stored.update((article["url"], article) for article in batch)
+            stats["committed"] += len(batch)
+            logging.info("Committed %d streamed articles.", len(batch))
+            _run_actions(actions)
+    finally:
+        if classifier is not None and hasattr(classifier, "close"):
+            classifier.close()
+        if builder is not None and builder.cache is not None:
+            builder.cache.close()
+
+
+def run(site_names=None, store_file=store.STORE_FILE, use_cache=True, queue_size=QUEUE_SIZE,
+        batch_size=BATCH_SIZE, classifier_factory=None, classification_cache=None, builder_factory=None):
+    selected = [sites.get_site(name) for name in site_names] if site_names else sites.SITES
+    scraped_urls = urlindex.load_seen(store_file=store_file)
+    classifier_factory = classifier_factory or classify.load_classifier
+
+    articles_queue = queue.Queue(maxsize=queue_size)
+    stats = {"classified": 0, "committed": 0, "error": None}
+    worker = threading.Thread(
+        target=classify_worker,
+        args=(articles_queue, classifier_factory, batch_size, store_file, classification_cache, stats,
+              builder_factory),
+        name="classifier",
+    )
+
+    def enqueue(article):
+        # Once the worker has failed, nothing more can be stored: stop scraping
+        while stats["error"] is None:
+            try:
+                articles_queue.put(article, timeout=1)
+                return
+            except queue.Full:
+                continue
+        raise RuntimeError("The streaming classifier failed; not scraping further.")
+
+    retry_queue = RetryQueue()
+    worker.start()
+    try:
+        scrape.scrape_sites(selected, scraped_urls, use_cache, on_article=enqueue, retry_queue=retry_queue,
+                            defer=enqueue)
+    finally:
+        while worker.is_alive():
+            try:
+                articles_queue.put(_DONE, timeout=1)
+                break
+            except queue.Full:
+                continue
+        worker.join()
+        # Again, now that the worker has cleared the committed articles
+        retry_queue.save()
+
+    if stats["error"] is not None:
+        raise RuntimeError(f"Streaming run failed after committing {stats['committed']} articles.") from stats["error"]
+    logging.info("Streaming run finished: %d articles committed, %d classified.",
+                 stats["committed"], stats["classified"])
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape every outlet and classify new articles as they arrive.")
+    parser.add_argument("--site", action="append", dest="sites", metavar="SITE_NAME",
+                        help="Only scrape this outlet (may be repeated).")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the HTTP or classification caches.")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE,
+                        help="Articles that may wait for classification before scrapers pause.")
+    parser.add_argument("--model", default=MODEL_ID)
+    parser.add_argument("--backend", choices=BACKENDS, default="torch")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--no-service", action="store_true",
+                        help="Always load the model in this process, even if a classifier service is running.")
+    classify.add_premise_args(parser)
+    parser.add_argument("--profile", action="store_true",
+                        help=f"Profile the run with cProfile (written to {metrics.REPORT_DIR}/stream.prof).")
+    args = parser.parse_args()
+
+    def classifier_factory():
+        return classify.load_classifier(args.model, args.backend, args.workers, use_service=not args.no_service)
+
+    def builder_factory(classifier):
+        return classify.load_builder(classifier, args.token_budget, args.windows, args.aggregate, not args.no_cache)
+
+    cache = None if args.no_cache else ClassificationCache()
+    try:
+        with metrics.run_report("stream", profile=args.profile):
+            run(args.sites, use_cache=not args.no_cache, queue_size=args.queue_size, batch_size=args.batch_size,
+                classifier_factory=classifier_factory, classification_cache=cache, builder_factory=builder_factory)
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+if __name__ == "__main__":
+    main()
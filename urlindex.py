@@ -0,0 +1,64 @@
+import os
+import logging
+from urllib.parse import urlsplit, urlunsplit
+
+import store
+
+# Compact on-disk index of every article URL we have already scraped.
+#
+# One canonical URL per line, append-only. Scrapers read this instead of the
+# article store, so checking for known links never deserializes article bodies.
+
+SEEN_FILE = "seen_urls.txt"
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def canonicalize_url(url):
+    """Normalize an article URL so the same page always maps to the same key.
+
+    Drops the query string and fragment (tracking parameters such as
+    Boston.com's ?p1=...), lowercases the scheme and host, removes a default
+    port and gives directory-style paths a trailing slash.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+
+    path = parts.path or "/"
+    last_segment = path.rsplit("/", 1)[-1]
+    if not path.endswith("/") and "." not in last_segment:
+        path += "/"
+    return urlunsplit((scheme, host, path, "", ""))
+
+
+def load_seen(path=SEEN_FILE, store_file=store.STORE_FILE):
+    """Return the set of canonical URLs already scraped."""
+    if not os.path.exists(path):
+        rebuild(path, store_file)
+    with open(path, "r", encoding="utf-8") as f:
+        seen = {line.rstrip("\n") for line in f if line.endswith("\n")}
+    logging.info("Loaded %d seen URLs from %s.", len(seen), path)
+    return seen
+
+
+def add_seen(urls, path=SEEN_FILE):
+    urls = [canonicalize_url(url) for url in urls]
+    if not urls:
+        return
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("".join(url + "\n" for url in urls))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def rebuild(path=SEEN_FILE, store_file=store.STORE_FILE):
+    """Recreate the index from the article store (only needed once, or after loss)."""
+    store.bootstrap(store_file)
+    urls = sorted({canonicalize_url(record["url"]) for record in store.read_records(store_file)})
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write("".join(url + "\n" for url in urls))
+    os.replace(path + ".tmp", path)
+    logging.info("Rebuilt %s with %d URLs.", path, len(urls))